@@ -0,0 +1,102 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Тестовый пост {number}',
+            )
+            for number in range(25)
+        ]
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, **params):
+        response = self.guest.get(url, params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def test_feed_walks_by_cursor(self):
+        """Лента листается курсорами вперёд и назад без пропусков."""
+        url = reverse('api:index')
+        data = self.get_json(url)
+        seen = [post['id'] for post in data['results']]
+        self.assertIsNone(data['previous'])
+        while data['next']:
+            data = self.guest.get(data['next']).json()
+            seen += [post['id'] for post in data['results']]
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+        data = self.guest.get(data['previous']).json()
+        self.assertEqual(len(data['results']), 10)
+
+    def test_post_fields(self):
+        """Пост отдаётся только нужными полями."""
+        post = self.posts[1]
+        data = self.get_json(
+            reverse('api:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(data, {
+            'id': post.pk,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'author': 'author',
+            'group': 'test_slug',
+            'image': None,
+        })
+
+    def test_group_and_profile(self):
+        """Ленты группы и автора отбирают свои посты, чужие - 404."""
+        data = self.get_json(
+            reverse('api:group_list', args=('test_slug',)), limit=100)
+        self.assertEqual(len(data['results']), 12)
+        self.assertEqual({post['group'] for post in data['results']},
+                         {'test_slug'})
+        data = self.get_json(
+            reverse('api:profile', args=('author',)), limit=5)
+        self.assertEqual(len(data['results']), 5)
+        for url in (reverse('api:group_list', args=('nope',)),
+                    reverse('api:profile', args=('nobody',)),
+                    reverse('api:post_detail', kwargs={'post_id': 999})):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
+
+    def test_conditional_get(self):
+        """Неизменившаяся лента отдаёт 304 без выборки постов."""
+        url = reverse('api:index')
+        etag = self.guest.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_lighter_than_html(self):
+        """JSON ленты в разы меньше HTML: метка изменения и один запрос."""
+        with self.assertNumQueries(2):
+            api = self.guest.get(reverse('api:index'))
+        html = self.guest.get(reverse('posts:index'))
+        self.assertLess(len(api.content) * 3, len(html.content))
@@ -0,0 +1,108 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+
+from posts.conditional import (conditional_page, group_stamp, index_stamp,
+                               post_stamp, profile_stamp)
+from posts.models import Group, Post
+from posts.my_paginator import AFTER_PARAM, BEFORE_PARAM, KeysetPaginator
+
+User = get_user_model()
+
+# только столбцы, которые уходят клиенту; авторы и группы - join'ом
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug', 'image'
+)
+LIMIT_PARAM = 'limit'
+
+
+def json_response(data, status=200):
+    # компактный JSON без пробелов, кириллица как есть - так короче
+    return HttpResponse(
+        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def not_found():
+    return json_response({'detail': 'Не найдено'}, status=404)
+
+
+def serialize_post(row, storage):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': storage.url(row['image']) if row['image'] else None,
+    }
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get(LIMIT_PARAM, settings.PAGINATOR_COUNT))
+    except ValueError:
+        limit = settings.PAGINATOR_COUNT
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def feed_response(request, queryset):
+    """Страница ленты по курсорам (pub_date, id), как и в HTML."""
+    limit = page_limit(request)
+    page = KeysetPaginator(queryset.values(*POST_FIELDS), limit).get_page(
+        after=request.GET.get(AFTER_PARAM),
+        before=request.GET.get(BEFORE_PARAM),
+    )
+    storage = Post._meta.get_field('image').storage
+
+    def link(param, cursor):
+        if cursor is None:
+            return None
+        return f'{request.path}?{param}={cursor}&{LIMIT_PARAM}={limit}'
+
+    return json_response({
+        'results': [serialize_post(row, storage) for row in page],
+        'next': link(AFTER_PARAM, page.next_cursor),
+        'previous': link(BEFORE_PARAM, page.previous_cursor),
+    })
+
+
+@require_safe
+@conditional_page(index_stamp)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@require_safe
+@conditional_page(group_stamp)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return not_found()
+    return feed_response(request, Post.objects.filter(group_id=group_id))
+
+
+@require_safe
+@conditional_page(profile_stamp)
+def profile(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return not_found()
+    return feed_response(request, Post.objects.filter(author_id=author_id))
+
+
+@require_safe
+@conditional_page(post_stamp)
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        return not_found()
+    storage = Post._meta.get_field('image').storage
+    return json_response(serialize_post(row, storage))
@@ -0,0 +1,21 @@
+from django.db.backends.sqlite3 import base
+
+from core.db import apply_pragmas
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с профилем соединений из settings.SQLITE_PRAGMAS.
+
+    Транзакции начинаются с BEGIN IMMEDIATE: блокировка на запись берётся
+    сразу. При обычном BEGIN транзакция сначала читает, и если за это
+    время записал кто-то другой, повысить её до записи уже нельзя -
+    SQLite отвечает "database is locked" без всякого ожидания busy_timeout.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
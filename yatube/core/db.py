@@ -0,0 +1,119 @@
+"""Профиль соединений SQLite и обслуживание базы.
+
+Бэкенд core.backends.sqlite3 даёт каждому новому соединению прагмы из
+settings.SQLITE_PRAGMAS: WAL, чтобы читатели не ждали писателя,
+synchronous=NORMAL, в WAL безопасный при сбое процесса, ожидание
+блокировки вместо мгновенного "database is locked", кэш страниц и mmap.
+Соединения живут между запросами (CONN_MAX_AGE), так что прагмы
+выполняются один раз на соединение, а не на каждый запрос.
+"""
+from django.conf import settings
+
+# PRAGMA auto_vacuum: 2 - свободные страницы отдаются incremental_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def apply_pragmas(connection):
+    """Прагмы из SQLITE_PRAGMAS для нового соединения sqlite3.
+
+    Выполняются на соединении DB-API, в обход курсора Django, и не
+    попадают в счёт запросов страницы.
+    """
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def pragma(cursor, name):
+    cursor.execute(f'PRAGMA {name}')
+    return cursor.fetchone()[0]
+
+
+def enable_incremental_vacuum(connection):
+    """Переводит базу на auto_vacuum=INCREMENTAL.
+
+    Для базы с таблицами режим меняется только полным VACUUM: он
+    переписывает файл целиком и держит блокировку на запись всё время.
+    """
+    with connection.cursor() as cursor:
+        if pragma(cursor, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+            return False
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+    return True
+
+
+def maintain(connection, vacuum_pages=0):
+    """Обслуживание базы: incremental vacuum, ANALYZE и checkpoint WAL.
+
+    vacuum_pages - сколько свободных страниц вернуть за раз, 0 - все.
+    Выполняется вне транзакции. Возвращает словарь с итогами для отчёта.
+    """
+    with connection.cursor() as cursor:
+        free_pages = pragma(cursor, 'freelist_count')
+        vacuumed = None
+        if pragma(cursor, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+            # прагма освобождает по странице на шаг, а execute делает
+            # только первый шаг; executescript выполняет её до конца
+            connection.connection.executescript(
+                f'PRAGMA incremental_vacuum({vacuum_pages})')
+            vacuumed = free_pages - pragma(cursor, 'freelist_count')
+        cursor.execute('ANALYZE')
+        # TRUNCATE ещё и обрезает файл WAL до нуля; вне WAL - (0, -1, -1)
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        busy, wal_pages, checkpointed = cursor.fetchone()
+    return {
+        'free_pages': free_pages,
+        'vacuumed_pages': vacuumed,
+        'checkpoint_busy': bool(busy),
+        'wal_pages': wal_pages,
+        'checkpointed_pages': checkpointed,
+    }
+
+
+def sync_position(connection):
+    """Номер копирования, которым получена база реплики.
+
+    Хранится в PRAGMA user_version: Django это поле заголовка не
+    трогает. Читается на соединении DB-API, мимо счёта запросов.
+    """
+    connection.ensure_connection()
+    return connection.connection.execute(
+        'PRAGMA user_version').fetchone()[0]
+
+
+def data_stamp(connection):
+    """Отметка изменений базы на соединении DB-API.
+
+    PRAGMA data_version меняется после коммитов других соединений, а
+    total_changes - после записей самого соединения. Сравнивать
+    отметки можно только снятые на одном соединении.
+    """
+    data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+    return connection, data_version, connection.total_changes
+
+
+def copy_database(source, target):
+    """Копирует базу source в target целиком через backup API SQLite.
+
+    Копия согласована, даже пока в source пишут; читатели target до
+    конца копирования видят прежние данные. Так обновляются реплики.
+    Каждое копирование поднимает sync_position копии, а если source с
+    прошлого раза не менялся, копия и её позиция остаются прежними:
+    кэши страниц, прочитанных с реплики, не сбрасываются зря.
+    Возвращает, было ли копирование.
+    """
+    source.ensure_connection()
+    stamp = data_stamp(source.connection)
+    position = sync_position(target)
+    if _copied.get(target.alias) == (stamp, position):
+        return False
+    source.connection.backup(target.connection)
+    # backup переносит заголовок source; user_version - 32-битное
+    position = position % 2 ** 31 + 1
+    target.connection.execute(f'PRAGMA user_version = {position}')
+    _copied[target.alias] = (stamp, position)
+    return True
+
+
+# алиас копии -> отметка source и позиция копии после копирования
+_copied = {}
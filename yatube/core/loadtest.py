@@ -0,0 +1,346 @@
+"""Нагрузочный прогон сайта: WSGI-сервер в несколько процессов и клиенты.
+
+Сервер - wsgiref с потоком на соединение, поднятый в нескольких
+процессах на одном слушающем сокете (как prefork у gunicorn). Клиенты -
+потоки со своими cookie, каждый выбирает следующее действие по весам
+смеси. Задержки пишутся по имени URL и методу.
+"""
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import socket
+import subprocess
+import threading
+import time
+from http.cookies import SimpleCookie
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode, urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+# смесь по умолчанию: доли действий в процентах
+DEFAULT_MIX = {
+    'posts:index': 35,
+    'posts:group_list': 15,
+    'posts:profile': 15,
+    'posts:post_detail': 25,
+    'posts:post_create': 5,
+    'users:login': 5,
+}
+USERNAME_PREFIX = 'loadtest_'
+PASSWORD = 'loadtest-password'
+CSRF_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(sock, debug):
+    # соединения родителя после fork не годятся
+    connections.close_all()
+    settings.DEBUG = debug
+    from yatube.wsgi import application
+    host, port = sock.getsockname()[:2]
+    server = ThreadingWSGIServer(
+        (host, port), QuietHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.server_name, server.server_port = host, port
+    server.setup_environ()
+    server.set_app(application)
+    server.serve_forever()
+
+
+def start_server(workers, host='127.0.0.1', port=0, debug=False):
+    """Запускает сервер в workers процессах, возвращает (адрес, процессы)."""
+    # socket.create_server появился только в Python 3.8
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=_serve, args=(sock, debug), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    address = sock.getsockname()[:2]
+    sock.close()
+    return address, processes
+
+
+def stop_server(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def prepare_users(count):
+    """Заводит недостающих пользователей прогона с общим паролем."""
+    usernames = [f'{USERNAME_PREFIX}{number}' for number in range(count)]
+    existing = set(User.objects.filter(
+        username__in=usernames).values_list('username', flat=True))
+    # хэш пароля считается один раз: он нарочно медленный
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        User(username=username, password=password)
+        for username in usernames if username not in existing
+    )
+    return usernames
+
+
+def sample_targets(limit):
+    """Адреса страниц для прогона: свежие посты, их авторы и группы."""
+    posts = list(Post.objects.order_by('-pk').values_list(
+        'pk', 'author__username')[:limit])
+    return {
+        'posts:index': [reverse('posts:index')],
+        'posts:group_list': [
+            reverse('posts:group_list', args=(slug,))
+            for slug in Group.objects.values_list('slug', flat=True)[:limit]
+        ],
+        'posts:profile': sorted({
+            reverse('posts:profile', args=(username,))
+            for _, username in posts
+        }),
+        'posts:post_detail': [
+            reverse('posts:post_detail', args=(pk,)) for pk, _ in posts
+        ],
+    }
+
+
+class Recorder:
+    """Задержки запросов по (имя URL, метод)."""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, name, method, started, latency, ok):
+        with self.lock:
+            self.samples.append((name, method, started, latency, ok))
+
+
+class VirtualClient:
+    """Один читатель: соединение, cookie и вход по требованию."""
+
+    def __init__(self, address, username, rng, recorder):
+        self.address = address
+        self.username = username
+        self.rng = rng
+        self.recorder = recorder
+        self.cookies = {}
+        self.logged_in = False
+        self.connection = None
+
+    def request(self, method, path, fields=None):
+        body = urlencode(fields).encode() if fields is not None else None
+        headers = {'Host': '{}:{}'.format(*self.address)}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items())
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    *self.address, timeout=60)
+            try:
+                self.connection.request(method, path, body, headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # сервер закрыл соединение - открываем новое
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, content
+
+    def fetch(self, name, method, path, fields=None, expected=200):
+        """Запрос с записью задержки; ошибка сети - тоже ошибка."""
+        started = time.monotonic()
+        try:
+            status, content = self.request(method, path, fields)
+        except (http.client.HTTPException, OSError):
+            status, content = None, b''
+        self.recorder.add(name, method, started,
+                          time.monotonic() - started, status == expected)
+        return status, content
+
+    def submit(self, name, path, fields):
+        """GET формы за csrf-токеном и POST с полями; успех - редирект."""
+        status, content = self.fetch(name, 'GET', path)
+        match = CSRF_RE.search(content)
+        if status != 200 or match is None:
+            return False
+        fields['csrfmiddlewaretoken'] = match.group(1).decode()
+        status, _ = self.fetch(name, 'POST', path, fields, expected=302)
+        return status == 302
+
+    def login(self):
+        self.logged_in = self.submit('users:login', reverse('users:login'), {
+            'username': self.username,
+            'password': PASSWORD,
+        })
+
+    def create_post(self):
+        if not self.logged_in:
+            self.login()
+        if self.logged_in:
+            self.submit('posts:post_create', reverse('posts:post_create'), {
+                'text': f'Нагрузочный пост {self.rng.random()}',
+            })
+
+    def visit(self, name, paths):
+        self.fetch(name, 'GET', self.rng.choice(paths))
+
+
+def run_client(client, mix, targets, deadline):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.monotonic() < deadline:
+        name = client.rng.choices(names, weights)[0]
+        if name == 'users:login':
+            client.login()
+        elif name == 'posts:post_create':
+            client.create_post()
+        else:
+            client.visit(name, targets[name])
+
+
+def percentile(sorted_values, share):
+    """Процентиль по ближайшему рангу."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(share * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, started, warmup, duration):
+    """Сводка по (имя URL, метод) и общая, без разогрева."""
+    since = started + warmup
+    groups = {}
+    for name, method, at, latency, ok in samples:
+        if at >= since:
+            groups.setdefault(f'{name} {method}', []).append((latency, ok))
+    groups = dict(sorted(groups.items()))
+    groups['total'] = [
+        item for key, items in groups.items() for item in items
+    ]
+    measured = duration - warmup
+    summary = {}
+    for key, items in groups.items():
+        latencies = sorted(latency for latency, _ in items)
+        errors = sum(1 for _, ok in items if not ok)
+        summary[key] = {
+            'requests': len(items),
+            'errors': errors,
+            'error_rate': errors / len(items) if items else 0,
+            'rps': len(items) / measured if measured else 0,
+            'p50_ms': _ms(percentile(latencies, 0.50)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+        }
+    return summary
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def run(address, mix, clients, duration, warmup, targets, usernames,
+        seed=0):
+    """Гоняет clients клиентов duration секунд, возвращает сводку."""
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=run_client, args=(
+            VirtualClient(address, usernames[number % len(usernames)],
+                          random.Random(seed + number), recorder),
+            mix, targets, deadline,
+        ))
+        for number in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder.samples, started, warmup, duration)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_result(result, directory):
+    """Пишет прогон в JSON, возвращает путь к файлу."""
+    os.makedirs(directory, exist_ok=True)
+    name = time.strftime('%Y%m%d-%H%M%S') + '.json'
+    path = os.path.join(directory, name)
+    with open(path, 'w') as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_result(path, directory):
+    """Прогон из файла; 'last' - последний сохранённый в directory."""
+    if path == 'last':
+        names = sorted(
+            name for name in os.listdir(directory) if name.endswith('.json')
+        ) if os.path.isdir(directory) else []
+        if not names:
+            return None
+        path = os.path.join(directory, names[-1])
+    with open(path) as file:
+        return json.load(file)
+
+
+def parse_mix(value):
+    """Смесь из строки вида 'posts:index=40,users:login=5'."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'неизвестное действие {name!r}')
+        mix[name] = float(weight)
+    return mix
+
+
+def parse_url(url):
+    parts = urlsplit(url)
+    return parts.hostname, parts.port or 80
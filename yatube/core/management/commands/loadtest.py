@@ -0,0 +1,136 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+COLUMNS = ('requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон: поднимает WSGI-сервер в нескольких процессах '
+        'и гоняет смесь запросов из множества клиентов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Процессов сервера, по умолчанию по числу ядер'
+        )
+        parser.add_argument(
+            '--url',
+            help='Гонять уже запущенный сервер (например, gunicorn) '
+                 'вместо встроенного'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=32,
+            help='Одновременных клиентов'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность прогона, секунд'
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=5,
+            help='Первые секунды прогона не входят в отчёт'
+        )
+        parser.add_argument(
+            '--mix', type=loadtest.parse_mix,
+            default=dict(loadtest.DEFAULT_MIX),
+            help='Веса действий: posts:index=40,users:login=5,...'
+        )
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Сколько пользователей прогона завести для входа и постов'
+        )
+        parser.add_argument(
+            '--targets', type=int, default=1000,
+            help='Сколько свежих постов, авторов и групп обходить'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--debug', action='store_true',
+            help='Оставить DEBUG как в настройках; по умолчанию выключен'
+        )
+        parser.add_argument(
+            '--results-dir', default=settings.LOADTEST_RESULTS_DIR,
+            help='Куда сохранять результаты прогонов'
+        )
+        parser.add_argument(
+            '--compare',
+            help="Сравнить с сохранённым прогоном: путь к файлу или 'last'"
+        )
+
+    def handle(self, *args, **options):
+        if options['warmup'] >= options['duration']:
+            raise CommandError('Разогрев должен быть короче прогона')
+        baseline = None
+        if options['compare']:
+            baseline = loadtest.load_result(
+                options['compare'], options['results_dir'])
+            if baseline is None:
+                raise CommandError('Сохранённых прогонов ещё нет')
+        usernames = loadtest.prepare_users(options['users'])
+        targets = loadtest.sample_targets(options['targets'])
+        mix = {
+            name: weight for name, weight in options['mix'].items()
+            if name not in targets or targets[name]
+        }
+        for name in options['mix'].keys() - mix.keys():
+            self.stderr.write(f'{name}: нет страниц для обхода, пропущено')
+
+        processes = []
+        if options['url']:
+            address = loadtest.parse_url(options['url'])
+        else:
+            address, processes = loadtest.start_server(
+                options['workers'], debug=options['debug'] and settings.DEBUG)
+        self.stdout.write(
+            'Прогон {}:{}: {} клиентов, {} с'.format(
+                *address, options['clients'], options['duration']))
+        try:
+            summary = loadtest.run(
+                address, mix, options['clients'], options['duration'],
+                options['warmup'], targets, usernames, options['seed'],
+            )
+        finally:
+            loadtest.stop_server(processes)
+
+        self.write_summary(summary, baseline)
+        config = {
+            key: options[key] for key in (
+                'url', 'clients', 'duration', 'warmup', 'mix', 'users',
+                'seed',
+            )
+        }
+        config['workers'] = None if options['url'] else options['workers']
+        path = loadtest.save_result({
+            'revision': loadtest.git_revision(),
+            'config': config,
+            'summary': summary,
+        }, options['results_dir'])
+        self.stdout.write(self.style.SUCCESS(f'Результаты: {path}'))
+
+    def write_summary(self, summary, baseline):
+        self.stdout.write('{:<32}'.format('') + ''.join(
+            f'{column:>10}' for column in COLUMNS))
+        for key, row in summary.items():
+            line = f'{key:<32}' + ''.join(
+                f'{self.format(row[column]):>10}' for column in COLUMNS)
+            old = (baseline or {}).get('summary', {}).get(key)
+            if old and old['p95_ms'] and row['p95_ms']:
+                line += ' p95 {:+.0%}, rps {:+.0%}'.format(
+                    row['p95_ms'] / old['p95_ms'] - 1,
+                    row['rps'] / old['rps'] - 1 if old['rps'] else 0,
+                )
+            self.stdout.write(line)
+
+    @staticmethod
+    def format(value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return f'{value:.1f}'
+        return str(value)
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db import enable_incremental_vacuum, maintain
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание базы SQLite: incremental vacuum, ANALYZE и '
+            'checkpoint WAL, раз в --interval секунд')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=0,
+            help='Сколько свободных страниц возвращать за проход; 0 - все'
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести базу на auto_vacuum=INCREMENTAL полным VACUUM'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=60 * 60,
+            help='Пауза между проходами, секунд'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Один проход и выйти'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite')
+        if options['enable_incremental_vacuum']:
+            if enable_incremental_vacuum(connection):
+                self.stdout.write('База переведена на incremental vacuum')
+        while True:
+            stats = maintain(connection, options['vacuum_pages'])
+            if stats['vacuumed_pages'] is None:
+                vacuum = (f'свободных страниц {stats["free_pages"]}, '
+                          f'incremental vacuum выключен')
+            else:
+                vacuum = f'освобождено страниц {stats["vacuumed_pages"]}'
+            checkpoint = (
+                'checkpoint отложен: база занята'
+                if stats['checkpoint_busy']
+                else f'в базу перенесено страниц WAL '
+                     f'{max(stats["checkpointed_pages"], 0)}'
+            )
+            self.stdout.write(f'{vacuum}; статистика обновлена; {checkpoint}')
+            if options['once']:
+                break
+            # между проходами соединение не держим
+            connection.close()
+            time.sleep(options['interval'])
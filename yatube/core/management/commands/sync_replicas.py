@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db import copy_database
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики для чтения, раз в '
+            '--interval секунд')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'replicas', nargs='*',
+            help='Алиасы реплик; по умолчанию DATABASE_REPLICAS'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между копированиями, секунд'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Скопировать один раз и выйти'
+        )
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не заданы: см. DATABASE_REPLICAS')
+        wrong = set(replicas) - (settings.DATABASES.keys() - {
+            DEFAULT_DB_ALIAS})
+        if wrong:
+            raise CommandError(f'Не реплики: {", ".join(sorted(wrong))}')
+        source = connections[DEFAULT_DB_ALIAS]
+        while True:
+            started = time.monotonic()
+            copied = [alias for alias in replicas
+                      if copy_database(source, connections[alias])]
+            if copied:
+                self.stdout.write(
+                    f'Реплики {", ".join(copied)} обновлены за '
+                    f'{time.monotonic() - started:.2f} с')
+            else:
+                self.stdout.write('Реплики без изменений')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
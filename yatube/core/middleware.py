@@ -0,0 +1,91 @@
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from .routers import read_from
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """Следит, чтобы страница укладывалась в свой бюджет SQL-запросов.
+
+    Бюджеты задаются в settings.QUERY_BUDGETS по имени URL. Превышение
+    пишется в лог, а при QUERY_BUDGET_RAISE ещё и роняет запрос, чтобы
+    N+1 был замечен до выкладки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGETS:
+            return self.get_response(request)
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and len(queries) > budget:
+            message = (
+                f'{view_name}: {len(queries)} SQL-запросов '
+                f'при бюджете {budget} ({request.method} {request.path})'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class ReplicaMiddleware:
+    """Отдаёт запросам без записи реплику из settings.DATABASE_REPLICAS.
+
+    Запрос с записью (не GET/HEAD/OPTIONS) и админка читают из default,
+    а после удачной записи (ответ 2xx или 3xx) ставится cookie
+    REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS: пока реплики догоняют,
+    пользователь читает из default и видит свою запись - например,
+    новый пост в профиле после редиректа из post_create.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return self.get_response(request)
+        writes = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        primary = (
+            writes
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+            or request.path.startswith(reverse('admin:index'))
+        )
+        # реплика одна на весь запрос: страница видит один срез данных
+        with read_from(None if primary else random.choice(replicas)):
+            response = self.get_response(request)
+        # после отказа (4xx) или сбоя (5xx) ждать реплику незачем
+        if writes and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
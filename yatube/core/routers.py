@@ -0,0 +1,67 @@
+"""Чтение из реплик с возвратом к основной базе после записи.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. Из реплики читает
+только запрос, которому её выдал ReplicaMiddleware: GET без недавней
+записи того же пользователя и не в админке. Всё остальное - команды,
+фоновые задачи, запросы с записью - читает и пишет в default.
+
+Версии ключей кэша поднимаются при записи в default, и отставшая
+реплика могла бы положить старые данные под новую версию. Поэтому в
+ключи кэшей страниц входит read_position: собранное из реплики живёт
+под её номером копирования и уходит из оборота со следующим.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .db import sync_position
+
+_state = threading.local()
+
+
+@contextmanager
+def read_from(alias):
+    """Внутри блока чтение идёт из реплики alias; None - из default."""
+    previous = getattr(_state, 'replica', None), getattr(
+        _state, 'position', None)
+    _state.replica = alias
+    # номер читается до данных: данные бывают только новее него
+    _state.position = (
+        None if alias is None else sync_position(connections[alias]))
+    try:
+        yield
+    finally:
+        _state.replica, _state.position = previous
+
+
+def _replica():
+    replica = getattr(_state, 'replica', None)
+    # внутри транзакции читаем её же данные, ещё не видные репликам
+    if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return None
+    return replica
+
+
+def read_position():
+    """Срез данных, из которого сейчас идёт чтение, для ключей кэша."""
+    replica = _replica()
+    if replica is None:
+        return DEFAULT_DB_ALIAS
+    return f'{replica}@{_state.position}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии default, и объекты из них связаны как одни
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схему реплики получают вместе с копией базы
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import (Client, LiveServerTestCase, SimpleTestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core import loadtest
+from core.backends.sqlite3.base import DatabaseWrapper
+from core.db import (AUTO_VACUUM_INCREMENTAL, copy_database, maintain,
+                     pragma, sync_position)
+from core.routers import read_from
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class LoadTestHelpersTests(SimpleTestCase):
+    def test_percentile(self):
+        """Процентиль берётся по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 0.5), 50)
+        self.assertEqual(loadtest.percentile(values, 0.99), 99)
+        self.assertEqual(loadtest.percentile([7], 0.95), 7)
+        self.assertIsNone(loadtest.percentile([], 0.5))
+
+    def test_summarize_skips_warmup(self):
+        """Запросы разогрева не входят в сводку, ошибки считаются."""
+        samples = [
+            ('posts:index', 'GET', 0.5, 9.0, True),
+            ('posts:index', 'GET', 1.5, 0.1, True),
+            ('posts:index', 'GET', 2.0, 0.3, False),
+        ]
+        summary = loadtest.summarize(samples, 0, warmup=1, duration=3)
+        row = summary['posts:index GET']
+        self.assertEqual(row['requests'], 2)
+        self.assertEqual(row['errors'], 1)
+        self.assertEqual(row['rps'], 1)
+        self.assertEqual(row['p99_ms'], 300)
+        self.assertEqual(list(summary)[-1], 'total')
+
+    def test_parse_mix(self):
+        """Смесь задаётся весами по именам URL."""
+        self.assertEqual(
+            loadtest.parse_mix('posts:index=3, users:login=1'),
+            {'posts:index': 3, 'users:login': 1})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('posts:nope=1')
+
+    def test_results_saved_for_comparison(self):
+        """Прогоны сохраняются, 'last' находит последний."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(loadtest.load_result('last', directory))
+            loadtest.save_result({'summary': {'total': {}}}, directory)
+            self.assertEqual(
+                loadtest.load_result('last', directory),
+                {'summary': {'total': {}}})
+
+
+class LoadTestRunTests(LiveServerTestCase):
+    def test_mix_runs_without_errors(self):
+        """Смесь со входом и постами проходит по живому серверу без ошибок."""
+        # клиент один: база тестов в памяти общая на потоки сервера, и
+        # параллельные запись с чтением ловят блокировку таблицы
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='-')
+        Post.objects.create(author=author, group=group, text='Тестовый пост')
+        usernames = loadtest.prepare_users(2)
+        summary = loadtest.run(
+            loadtest.parse_url(self.live_server_url),
+            loadtest.DEFAULT_MIX, clients=1, duration=1.5, warmup=0,
+            targets=loadtest.sample_targets(10), usernames=usernames,
+        )
+        self.assertGreater(summary['total']['requests'], 0)
+        self.assertEqual(summary['total']['errors'], 0, summary)
+        self.assertIn('posts:index GET', summary)
+
+
+class SqliteProfileTests(SimpleTestCase):
+    def connect(self, path):
+        wrapper = DatabaseWrapper(
+            dict(connection.settings_dict, NAME=path), alias='profile')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def test_new_connection_gets_pragmas(self):
+        """Новое соединение получает WAL, ожидание блокировки и вакуум."""
+        with self.connect(self.path).cursor() as cursor:
+            self.assertEqual(pragma(cursor, 'journal_mode'), 'wal')
+            self.assertEqual(pragma(cursor, 'synchronous'), 1)
+            self.assertEqual(pragma(cursor, 'busy_timeout'), 5000)
+            self.assertEqual(
+                pragma(cursor, 'auto_vacuum'), AUTO_VACUUM_INCREMENTAL)
+
+    def test_transaction_takes_write_lock(self):
+        """Транзакция сразу берёт блокировку на запись."""
+        writer = self.connect(self.path)
+        writer.ensure_connection()
+        # так транзакцию начинает atomic
+        writer.set_autocommit(
+            False, force_begin_transaction_with_broken_autocommit=True)
+        self.addCleanup(writer.rollback)
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(
+                sqlite3.OperationalError, 'database is locked'):
+            other.execute('BEGIN IMMEDIATE')
+
+    def test_maintain_vacuums_free_pages(self):
+        """Обслуживание возвращает свободные страницы и делает checkpoint."""
+        wrapper = self.connect(self.path)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE junk (data TEXT)')
+            cursor.executemany(
+                'INSERT INTO junk VALUES (%s)', [('x' * 1000,)] * 500)
+            cursor.execute('DELETE FROM junk')
+        stats = maintain(wrapper)
+        self.assertGreater(stats['vacuumed_pages'], 0)
+        self.assertFalse(stats['checkpoint_busy'])
+        with wrapper.cursor() as cursor:
+            self.assertEqual(pragma(cursor, 'freelist_count'), 0)
+
+
+class SqliteMaintenanceCommandTests(TransactionTestCase):
+    def test_single_pass(self):
+        """Команда с --once делает один проход и выходит."""
+        out = StringIO()
+        call_command('sqlite_maintenance', '--once', stdout=out)
+        self.assertIn('статистика обновлена', out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.client.force_login(self.author)
+        self.profile_url = reverse('posts:profile', args=('author',))
+        copy_database(connections['default'], connections['replica'])
+        # после копирования пишем только в default: реплика отстала
+        self.post = Post.objects.create(
+            author=self.author, text='Свежий пост')
+
+    def test_reads_go_to_replica(self):
+        """Страница без записи читает из реплики и не видит новое."""
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.context['user'], self.author)
+        self.assertNotContains(response, 'Свежий пост')
+
+    def test_write_pins_to_primary(self):
+        """После записи пользователь читает из default, пока стоит cookie."""
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'},
+            follow=True)
+        self.assertContains(response, 'Новый пост')
+        self.assertContains(response, 'Свежий пост')
+        self.assertEqual(
+            self.client.cookies[settings.REPLICA_PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS)
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertNotContains(
+            self.client.get(self.profile_url), 'Новый пост')
+
+    def test_failed_write_does_not_pin(self):
+        """Запрос с записью, кончившийся ошибкой, cookie не ставит."""
+        response = self.client.post(
+            reverse('posts:post_edit', args=(self.post.pk + 1,)),
+            {'text': 'Мимо'})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, self.client.cookies)
+
+    def test_sync_without_changes_keeps_position(self):
+        """Копирование без изменений в default позицию не двигает."""
+        replica = connections['replica']
+        self.assertTrue(
+            copy_database(connections['default'], connections['replica']))
+        position = sync_position(replica)
+        self.assertFalse(
+            copy_database(connections['default'], connections['replica']))
+        self.assertEqual(sync_position(replica), position)
+        Post.objects.filter(pk=self.post.pk).update(text='Правка')
+        self.assertTrue(
+            copy_database(connections['default'], connections['replica']))
+        self.assertEqual(sync_position(replica), position + 1)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_replica_reads_do_not_poison_caches(self):
+        """Отставшая реплика не кладёт старое в кэш под новые версии."""
+        copy_database(connections['default'], connections['replica'])
+        reader = Client()
+        feed_url = reverse('posts:profile_feed', args=('author', 'atom'))
+        self.assertContains(reader.get(self.profile_url), 'Свежий пост')
+        self.client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            {'text': 'Исправленный пост'})
+        # реплика ещё не догнала: читатель видит старое и кэширует его
+        self.assertContains(reader.get(self.profile_url), 'Свежий пост')
+        self.assertContains(reader.get(feed_url), 'Свежий пост')
+        copy_database(connections['default'], connections['replica'])
+        for client in (self.client, reader):
+            for url in (self.profile_url, feed_url):
+                with self.subTest(client=client, url=url):
+                    response = client.get(url)
+                    self.assertContains(response, 'Исправленный пост')
+                    self.assertNotContains(response, 'Свежий пост')
+
+    def test_admin_reads_primary(self):
+        """Админка всегда читает из default."""
+        User.objects.filter(pk=self.author.pk).update(
+            is_staff=True, is_superuser=True)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertContains(response, 'Свежий пост')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Без реплик всё читается из default."""
+        self.assertContains(self.client.get(self.profile_url), 'Свежий пост')
+
+    def test_transaction_reads_primary(self):
+        """Внутри транзакции чтение идёт из default."""
+        posts = Post.objects.filter(pk=self.post.pk)
+        with read_from('replica'):
+            self.assertFalse(posts.exists())
+            with transaction.atomic():
+                self.assertTrue(posts.exists())
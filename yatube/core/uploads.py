@@ -0,0 +1,110 @@
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+# заголовки картинок помещаются в начало файла; у JPEG перед размерами
+# бывает длинный EXIF, поэтому берём с запасом
+PROBE_BYTES = 256 * 1024
+
+
+class RejectedUpload(SimpleUploadedFile):
+    """Пустой файл на месте отброшенной загрузки, с причиной отказа."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(name, b'', content_type)
+        self.error = error
+
+
+def probe_image(header):
+    """Размеры картинки по началу файла без декодирования пикселей.
+
+    Возвращает None, если заголовок ещё не дочитан или это не картинка.
+    """
+    try:
+        with Image.open(BytesIO(header)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        return float('inf'), float('inf')
+    except Exception:
+        return None
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузки по кускам во временный файл на диске и проверяет их.
+
+    Файл отбрасывается, как только он перевалил за IMAGE_UPLOAD_MAX_SIZE
+    или заголовок показал размеры больше IMAGE_UPLOAD_MAX_DIMENSIONS:
+    временный файл удаляется, а остаток загрузки читается из запроса
+    и выбрасывается. Если уже Content-Length запроса больше лимита,
+    на диск не пишется ни байта. Вместо отброшенного файла форма
+    получает RejectedUpload с причиной отказа.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # поля формы вместе не больше DATA_UPLOAD_MAX_MEMORY_SIZE;
+        # None - полям лимита нет, и по длине запроса судить нельзя
+        fields_limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        self.request_too_large = fields_limit is not None and (
+            content_length > settings.IMAGE_UPLOAD_MAX_SIZE + fields_limit)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+        self.size_checked = False
+        self.rejected = None
+        if self.request_too_large:
+            self.reject(self.size_error())
+
+    def size_error(self):
+        limit = settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)
+        return f'Файл больше {limit} МБ'
+
+    def reject(self, error):
+        self.file.close()
+        self.rejected = RejectedUpload(
+            self.file_name, self.content_type, error)
+
+    def check_dimensions(self, final=False):
+        size = probe_image(self.header)
+        if size is None:
+            if final or len(self.header) >= PROBE_BYTES:
+                self.reject('Загрузите картинку')
+            return
+        self.size_checked = True
+        max_width, max_height = settings.IMAGE_UPLOAD_MAX_DIMENSIONS
+        width, height = size
+        if width > max_width or height > max_height:
+            self.reject(
+                f'Картинка больше {max_width}×{max_height} пикселей')
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejected is None and (
+                start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE):
+            self.reject(self.size_error())
+        if self.rejected is None and not self.size_checked:
+            self.header += raw_data[:PROBE_BYTES - len(self.header)]
+            self.check_dimensions()
+        if self.rejected is not None:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.rejected is None and not self.size_checked:
+            self.check_dimensions(final=True)
+        if self.rejected is not None:
+            return self.rejected
+        return super().file_complete(file_size)
+
+
+class BoundedImageField(forms.ImageField):
+    """Поле картинки, которое показывает причину отказа в загрузке."""
+
+    def to_python(self, data):
+        if isinstance(data, RejectedUpload):
+            raise forms.ValidationError(data.error, code='upload_rejected')
+        return super().to_python(data)
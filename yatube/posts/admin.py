@@ -1,16 +1,45 @@
 from django.contrib import admin
 
+from .changelist import IndexedDatesQuerySet, PostChangeList
 from .models import Post, Group
+from .my_paginator import WindowedPaginator
+from .search import build_match, matching_ids
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
+    # выпадающие списки на всех пользователей и группы не рисуем, в
+    # том числе в строках list_editable
+    autocomplete_fields = ('group',)
+    raw_id_fields = ('author',)
     search_fields = ('text',)
+    # оба отбора по дате сводятся к диапазону по индексу на pub_date
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    # COUNT(*) без фильтров считает всю таблицу
+    show_full_result_count = False
+    paginator = WindowedPaginator
     empty_value_display = '-пусто-'
 
+    def get_changelist(self, request, **kwargs):
+        return PostChangeList
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            model=queryset.model, query=queryset.query, using=queryset.db
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE '%...%' обходит все посты, ищем по индексу FTS5
+        match = build_match(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(pk__in=matching_ids(match)), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from core.routers import read_position
+
+from . import versions
+
+CARD_TEMPLATE = 'includes/card_body.html'
+HITS_KEY = 'card:stats:hits'
+MISSES_KEY = 'card:stats:misses'
+
+
+def _version_key(kind, pk):
+    return f'card:v:{kind}:{pk}'
+
+
+def invalidate(kind, pk):
+    """Делает устаревшими все карточки, зависящие от объекта."""
+    versions.invalidate(_version_key(kind, pk))
+
+
+def _count(key, value):
+    if not value:
+        return
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.set(key, value, None)
+
+
+def attach_cards(posts, group=None):
+    """Проставляет постам card_html из кэша, отрисовывая только промахи.
+
+    Ключ карточки состоит из id поста и версий поста, автора и группы,
+    так что правка любого из них сама выводит старую карточку из оборота.
+    Ещё в ключе срез данных (core.routers.read_position): карточка из
+    отставшей реплики не попадает к читателям default.
+    На странице группы ссылка на группу не нужна, это отдельный вариант.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    dependencies = {
+        post.pk: (
+            _version_key('post', post.pk),
+            _version_key('user', post.author_id),
+            _version_key('group', post.group_id),
+        )
+        for post in posts
+    }
+    current = versions.get_many(
+        {key for keys in dependencies.values() for key in keys}
+    )
+    language = get_language()
+    position = read_position()
+    card_keys = {
+        post.pk: 'card:{}:{}:{}:{}:{}'.format(
+            post.pk,
+            language,
+            position,
+            'g' if group else '',
+            '.'.join(str(current[key]) for key in dependencies[post.pk]),
+        )
+        for post in posts
+    }
+    cached = cache.get_many(card_keys.values())
+    rendered = {}
+    for post in posts:
+        key = card_keys[post.pk]
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'group': group}
+            )
+        post.card_html = mark_safe(html)
+    if rendered:
+        cache.set_many(rendered, settings.CARD_CACHE_TIMEOUT)
+    _count(HITS_KEY, len(posts) - len(rendered))
+    _count(MISSES_KEY, len(rendered))
+
+
+def card_cache_stats():
+    stats = cache.get_many((HITS_KEY, MISSES_KEY))
+    return {
+        'hits': stats.get(HITS_KEY, 0),
+        'misses': stats.get(MISSES_KEY, 0),
+    }
+
+
+def reset_card_cache_stats():
+    cache.delete_many((HITS_KEY, MISSES_KEY))
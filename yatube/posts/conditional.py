@@ -0,0 +1,74 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import AuthorStats, Group, Post
+
+
+def index_stamp():
+    updated = AuthorStats.objects.aggregate(updated=Max('updated'))['updated']
+    if updated is None:
+        return None
+    return updated, (updated,)
+
+
+def group_stamp(slug):
+    row = Group.objects.filter(slug=slug).values_list(
+        'updated', 'posts_count').first()
+    if row is None:
+        return None
+    return row[0], row
+
+
+def profile_stamp(username):
+    row = AuthorStats.objects.filter(author__username=username).values_list(
+        'updated', 'posts_count').first()
+    if row is None:
+        return None
+    return row[0], row
+
+
+def post_stamp(post_id):
+    row = Post.objects.filter(pk=post_id).values_list(
+        'updated', 'author__stats__updated', 'group__updated').first()
+    if row is None:
+        return None
+    return max(stamp for stamp in row if stamp is not None), row
+
+
+def conditional_page(stamp_func):
+    """Отвечает 304, если страница не менялась с прошлого запроса клиента.
+
+    stamp_func получает аргументы URL и дешёво, до основной выборки и
+    отрисовки, возвращает (время изменения, части ETag) или None, если
+    проверять нечего. Страница зависит от вошедшего пользователя, поэтому
+    его id тоже входит в ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            stamp = stamp_func(**kwargs)
+            if stamp is None:
+                return view(request, *args, **kwargs)
+            updated, parts = stamp
+            etag = quote_etag(hashlib.md5(':'.join(
+                str(part) for part in (request.user.pk, *parts)
+            ).encode()).hexdigest())
+            last_modified = timegm(updated.utctimetuple())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.setdefault('ETag', etag)
+                response.setdefault('Last-Modified', http_date(last_modified))
+            return response
+        return wrapper
+    return decorator
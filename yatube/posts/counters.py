@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AuthorStats, Follow, Group, GroupFollow, Post
+
+# SQLite вставляет пачку как составной SELECT, а в нём не больше 500 частей
+REBUILD_BATCH_SIZE = 500
+
+
+def change_author_posts_count(author_id, delta):
+    updated = AuthorStats.objects.filter(author_id=author_id).update(
+        posts_count=F('posts_count') + delta
+    )
+    if not updated and delta > 0:
+        # первой записи автора ещё нет - заводим её по фактическому числу
+        AuthorStats.objects.create(
+            author_id=author_id,
+            posts_count=Post.objects.filter(author_id=author_id).count()
+        )
+
+
+def change_group_posts_count(group_id, delta):
+    if group_id is None:
+        return
+    Group.objects.filter(pk=group_id).update(
+        posts_count=F('posts_count') + delta
+    )
+
+
+def touch_feeds(author_ids=(), group_ids=()):
+    """Отмечает, что ленты авторов и групп изменились."""
+    now = timezone.now()
+    AuthorStats.objects.filter(author_id__in=author_ids).update(updated=now)
+    Group.objects.filter(pk__in=group_ids).update(updated=now)
+
+
+def author_posts_count(author):
+    """Число постов автора из счётчика, без COUNT(*) по постам."""
+    stats = getattr(author, 'stats', None)
+    return stats.posts_count if stats is not None else 0
+
+
+@transaction.atomic
+def rebuild_counters():
+    """Пересчитывает все счётчики по таблицам постов и подписок.
+
+    Возвращает число авторов и групп, для которых записаны счётчики.
+    """
+    group_counts = Post.objects.filter(group=OuterRef('pk')).order_by()
+    group_counts = group_counts.values('group').annotate(
+        count=Count('pk')
+    ).values('count')
+    group_followers = GroupFollow.objects.filter(
+        group=OuterRef('pk')).order_by()
+    group_followers = group_followers.values('group').annotate(
+        count=Count('pk')
+    ).values('count')
+    groups = Group.objects.update(
+        posts_count=Coalesce(Subquery(group_counts), 0),
+        followers_count=Coalesce(Subquery(group_followers), 0),
+    )
+    AuthorStats.objects.all().delete()
+    rows = Post.objects.order_by().values_list('author').annotate(
+        count=Count('pk')
+    )
+    followers = dict(Follow.objects.order_by().values_list(
+        'author').annotate(count=Count('pk')))
+    stats = (
+        AuthorStats(author_id=author_id, posts_count=count,
+                    followers_count=followers.pop(author_id, 0))
+        for author_id, count in rows.iterator()
+    )
+    AuthorStats.objects.bulk_create(stats, batch_size=REBUILD_BATCH_SIZE)
+    # у подписчиков есть и авторы без единого поста
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(author_id=author_id, followers_count=count)
+         for author_id, count in followers.items()),
+        batch_size=REBUILD_BATCH_SIZE
+    )
+    return AuthorStats.objects.count(), groups
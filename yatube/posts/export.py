@@ -0,0 +1,64 @@
+import csv
+import json
+
+from django.conf import settings
+
+# имена столбцов совпадают с теми, что понимает import_posts
+EXPORT_COLUMNS = ('id', 'pub_date', 'author', 'group', 'text', 'image')
+EXPORT_FIELDS = (
+    'id', 'pub_date', 'author__username', 'group__slug', 'text', 'image'
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# столько байт копится перед отправкой: строка на запись сокета - это
+# слишком мелко
+BUFFER_SIZE = 64 * 1024
+
+
+class _Line:
+    """Файл для csv.writer, который просто возвращает записанное."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+
+def _rows(queryset):
+    rows = queryset.order_by('pub_date', 'id').values_list(
+        *EXPORT_FIELDS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for post_id, pub_date, author, group, text, image in rows:
+        yield post_id, pub_date.isoformat(), author, group or '', text, image
+
+
+def export_posts(queryset, export_format):
+    """Итератор байтов архива постов; память не зависит от их числа.
+
+    Посты читаются курсором по EXPORT_CHUNK_SIZE строк, только нужные
+    столбцы, без моделей.
+    """
+    lines = {'csv': _csv_lines, 'jsonl': _jsonl_lines}[export_format]
+    buffer = []
+    size = 0
+    for line in lines(_rows(queryset)):
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode()
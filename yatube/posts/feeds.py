@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from .models import Group, Post
+from .page_cache import cache_feed
+
+User = get_user_model()
+
+FEED_TYPES = {
+    'atom': Atom1Feed,
+    'rss': Rss201rev2Feed,
+}
+
+
+class PostFeed(Feed):
+    """Последние посты ленты в Atom или RSS.
+
+    Дата изменения поста - item_updateddate, поэтому Last-Modified
+    ленты сдвигается и при правке поста, а не только при новом.
+    """
+
+    def __init__(self, feed_type):
+        super().__init__()
+        self.feed_type = feed_type
+
+    def latest(self, posts):
+        """Последние посты выборки вместе с авторами и группами."""
+        return posts.select_related(
+            'author', 'group')[:settings.FEED_ITEMS_COUNT]
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(settings.FEED_TITLE_LENGTH)
+
+    def item_description(self, post):
+        return linebreaks(post.text, autoescape=True)
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', kwargs={'post_id': post.pk})
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_updateddate(self, post):
+        return post.updated
+
+    def item_categories(self, post):
+        return (post.group.title,) if post.group else ()
+
+
+class IndexFeed(PostFeed):
+    title = 'Yatube: последние обновления на сайте'
+    description = 'Новые посты всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return self.latest(Post.objects.all())
+
+
+class GroupFeed(PostFeed):
+    def get_object(self, request, slug, feed_format):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def items(self, group):
+        return self.latest(group.posts.all())
+
+
+class AuthorFeed(PostFeed):
+    def get_object(self, request, username, feed_format):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Посты автора {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def items(self, author):
+        return self.latest(author.posts.all())
+
+
+def feed_view(feed_class, *surrogate_keys):
+    """Вьюха ленты во всех форматах с общим кэшем на всех читателей."""
+    feeds = {
+        feed_format: feed_class(feed_type)
+        for feed_format, feed_type in FEED_TYPES.items()
+    }
+
+    @cache_feed(*surrogate_keys)
+    def view(request, feed_format, **kwargs):
+        feed = feeds.get(feed_format)
+        if feed is None:
+            raise Http404('Неизвестный формат ленты')
+        return feed(request, feed_format=feed_format, **kwargs)
+    return view
+
+
+index_feed = feed_view(IndexFeed, 'index')
+group_feed = feed_view(GroupFeed, 'group:{slug}')
+profile_feed = feed_view(AuthorFeed, 'author:{username}')
@@ -1,10 +1,12 @@
 from django import forms
+
+from core.uploads import BoundedImageField
 from .models import Post
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
-        # Добавили поле image в форму
-        fields = ('text', 'group')
-        # убрал image потому что тесты не пускают
+        fields = ('text', 'group', 'image')
+        # причину отказа в загрузке картинки показываем в форме
+        field_classes = {'image': BoundedImageField}
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+# в памяти процесса держим только описания картинок: они не меняются,
+# пока не сменится исходник. Списки миниатюр дописывает воркер, их
+# читаем из общего кэша
+LOCAL_IDENTITY = '||image||'
+
+
+class LRUCache:
+    """Ограниченный по размеру и времени жизни кэш в памяти процесса."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value, time.monotonic() + self.timeout
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(
+    settings.THUMBNAIL_LRU_SIZE, settings.THUMBNAIL_LRU_TIMEOUT
+)
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище ключей sorl: LRU процесса, затем общий кэш, затем база.
+
+    Тёплая отрисовка {% thumbnail %} не делает ни запросов к базе, ни
+    походов в общий кэш. Отсутствие миниатюры запоминается в общем кэше
+    ненадолго (THUMBNAIL_MISS_TIMEOUT), чтобы увидеть работу воркера из
+    другого процесса. Устаревшие записи других процессов живут не
+    дольше THUMBNAIL_LRU_TIMEOUT.
+    """
+
+    def get_many(self, image_files):
+        """Как get для нескольких картинок, но одним походом в кэш и базу."""
+        values = self._get_many_raw(
+            [add_prefix(image_file.key) for image_file in image_files])
+        return [
+            deserialize_image_file(value) if value else None
+            for value in values
+        ]
+
+    def _get_raw(self, key):
+        return self._get_many_raw([key])[0]
+
+    def _get_many_raw(self, keys):
+        found = {}
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                found[key] = value
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(self.cache.get_many(missing))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            for key in missing:
+                if key in stored:
+                    self.cache.set(key, stored[key],
+                                   thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+                    found[key] = stored[key]
+                else:
+                    self.cache.set(key, EMPTY_VALUE,
+                                   settings.THUMBNAIL_MISS_TIMEOUT)
+                    found[key] = EMPTY_VALUE
+        values = []
+        for key in keys:
+            value = found[key]
+            if value == EMPTY_VALUE:
+                value = None
+            elif LOCAL_IDENTITY in key:
+                local_cache.set(key, value)
+            values.append(value)
+        return values
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        local_cache.delete(key)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        local_cache.delete(*keys)
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import drain_queue, enqueue_many, make_pool
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь и нарезает варианты всех картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Размер пула; 0 - резать в этом же процессе'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько картинок ставить и резать за раз'
+        )
+        parser.add_argument(
+            '--enqueue-only', action='store_true',
+            help='Только поставить в очередь, резать будет thumbnail_worker'
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        enqueue_many(images.iterator(), options['batch_size'])
+        if options['enqueue_only']:
+            self.stdout.write('Картинки поставлены в очередь')
+            return
+        pool = make_pool(options['processes'])
+        total_ready = total_failed = 0
+        try:
+            for ready, failed in drain_queue(options['batch_size'], pool):
+                total_ready += ready
+                total_failed += failed
+                self.stdout.write(
+                    f'Готово картинок: {total_ready}, ошибок: {total_failed}')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Варианты нарезаны: картинок {total_ready}, '
+            f'ошибок {total_failed}'
+        ))
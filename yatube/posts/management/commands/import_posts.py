@@ -0,0 +1,100 @@
+import csv
+import heapq
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import PostImporter
+
+# сколько пропущенных строк перечислить в отчёте
+MAX_REPORTED_ERRORS = 20
+
+
+def read_jsonl(stream):
+    """Номера и строки файла; вместо битой строки - ValueError с причиной."""
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        try:
+            row = json.loads(line) if line else {}
+        except ValueError as error:
+            row = ValueError(f'не JSON: {error}')
+        yield number, row
+
+
+def read_csv(stream):
+    """Номера и строки файла; первая строка файла - заголовок."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из JSONL или CSV с полями text, author, '
+            'group, pub_date')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат; по умолчанию по расширению файла'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять за раз'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help='Сколько строк в одной транзакции'
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Заводить неизвестных авторов без пароля'
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Заводить неизвестные группы'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or path.rsplit('.', 1)[-1]
+        if input_format not in READERS:
+            raise CommandError('Укажите --format jsonl или csv')
+        importer = PostImporter(
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            create_authors=options['create_authors'],
+            create_groups=options['create_groups'],
+        )
+        try:
+            stream = (sys.stdin if path == '-'
+                      else open(path, newline='', encoding='utf-8'))
+        except OSError as error:
+            raise CommandError(error)
+        try:
+            for stats in importer.load(READERS[input_format](stream)):
+                self.stdout.write(
+                    f'Загружено {stats.imported}, '
+                    f'{stats.rate:.0f} строк/с')
+        except (ValueError, csv.Error) as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # даже после ошибки загруженное надо учесть в счётчиках
+            importer.finish()
+        stats = importer.stats
+        # внутри пачки строки неверного вида отсеиваются раньше прочих
+        for line, reason in heapq.nsmallest(
+                MAX_REPORTED_ERRORS, stats.errors):
+            self.stderr.write(f'Строка {line}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {stats.imported}, пропущено строк: '
+            f'{stats.skipped}, {stats.elapsed:.1f} с; вставка '
+            f'{stats.load_rate:.0f} строк/с, вместе с пересчётом '
+            f'{stats.rate:.0f} строк/с'
+        ))
@@ -0,0 +1,135 @@
+import os
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+
+def parse_srcset(srcset):
+    """Кандидаты srcset как пары (ширина, url)."""
+    candidates = []
+    for candidate in srcset.split(','):
+        url, _, descriptor = candidate.strip().partition(' ')
+        if url and descriptor.strip().endswith('w'):
+            candidates.append((int(descriptor.strip()[:-1]), url))
+    return sorted(candidates)
+
+
+def pick_candidate(candidates, needed_width):
+    """Как браузер: самый узкий вариант не уже нужного, иначе самый широкий."""
+    for width, url in candidates:
+        if width >= needed_width:
+            return url
+    return candidates[-1][1]
+
+
+class PictureParser(HTMLParser):
+    """Собирает картинки страницы: <img> и <source> его <picture>."""
+
+    def __init__(self):
+        super().__init__()
+        self.images = []
+        self.sources = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'picture':
+            self.sources = []
+        elif tag == 'source' and self.sources is not None:
+            self.sources.append(attrs)
+        elif tag == 'img':
+            self.images.append((attrs, self.sources or []))
+
+    def handle_endtag(self, tag):
+        if tag == 'picture':
+            self.sources = None
+
+
+def file_size(url, client):
+    """Размер файла за url: из MEDIA, STATIC или ответа самого сайта."""
+    path = unquote(urlsplit(url).path)
+    if path.startswith(settings.MEDIA_URL):
+        name = path[len(settings.MEDIA_URL):]
+        if default_storage.exists(name):
+            return default_storage.size(name)
+    elif path.startswith(settings.STATIC_URL):
+        found = finders.find(path[len(settings.STATIC_URL):])
+        if found:
+            return os.path.getsize(found)
+    elif not urlsplit(url).netloc:
+        # варианты, которые режутся по запросу (posts:resized_image)
+        response = client.get(url)
+        if response.status_code == 200:
+            return len(b''.join(response))
+    return 0
+
+
+class Command(BaseCommand):
+    help = 'Считает байты картинок на страницах до и после адаптивных версий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/'],
+            help='Адреса страниц, по умолчанию главная'
+        )
+        parser.add_argument(
+            '--viewport', type=int, default=375,
+            help='Ширина окна браузера в CSS-пикселях'
+        )
+        parser.add_argument(
+            '--dpr', type=float, default=2,
+            help='Плотность пикселей экрана'
+        )
+        parser.add_argument(
+            '--no-webp', action='store_true',
+            help='Браузер без поддержки WebP'
+        )
+
+    def chosen_url(self, img, sources, options):
+        """Что загрузит браузер с заданным экраном."""
+        full_width = settings.POST_IMAGE_SIZE[0]
+        needed = min(options['viewport'], full_width) * options['dpr']
+        for source in sources:
+            if options['no_webp'] and source.get('type') == 'image/webp':
+                continue
+            candidates = parse_srcset(source.get('srcset', ''))
+            if candidates:
+                return pick_candidate(candidates, needed)
+        candidates = parse_srcset(img.get('srcset', ''))
+        if candidates:
+            return pick_candidate(candidates, needed)
+        return img.get('src')
+
+    def handle(self, *args, **options):
+        client = Client()
+        total_before = total_after = 0
+        for path in options['paths']:
+            response = client.get(path)
+            parser = PictureParser()
+            parser.feed(response.content.decode())
+            # повторная картинка на странице берётся из кэша браузера
+            before = {img.get('src') for img, _ in parser.images}
+            after = {
+                self.chosen_url(img, sources, options)
+                for img, sources in parser.images
+            }
+            before_bytes = sum(
+                file_size(url, client) for url in before if url)
+            after_bytes = sum(
+                file_size(url, client) for url in after if url)
+            total_before += before_bytes
+            total_after += after_bytes
+            self.stdout.write(
+                f'{path}: HTML {len(response.content)} байт, картинок '
+                f'{len(parser.images)}, до {before_bytes} байт, '
+                f'после {after_bytes} байт'
+            )
+        saved = 1 - total_after / total_before if total_before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Итого картинок: до {total_before} байт, после {total_after} '
+            f'байт, экономия {saved:.0%}'
+        ))
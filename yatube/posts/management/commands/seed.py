@@ -0,0 +1,111 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.seed import CHUNK_SIZE, SEED_PASSWORD, Seeder
+
+
+def until_date(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетический набор данных: пользователей, группы, '
+            'подписки и посты с перекосом активности, как на живом сайте')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно: тот же набор при том же зерне')
+        parser.add_argument(
+            '--users', type=int, default=100000,
+            help='Сколько пользователей завести; 0 - писать от имени '
+                 'существующих'
+        )
+        parser.add_argument(
+            '--groups', type=int, default=1000,
+            help='Сколько групп завести; 0 - раскладывать по существующим'
+        )
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument(
+            '--follows', type=float, default=0,
+            help='Подписок на авторов в среднем на пользователя'
+        )
+        parser.add_argument(
+            '--group-follows', type=float, default=0,
+            help='Подписок на группы в среднем на пользователя'
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок нарисовать для постов'
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Доля постов с картинкой'
+        )
+        parser.add_argument(
+            '--author-skew', type=float, default=1.0,
+            help='Показатель Ципфа для активности авторов'
+        )
+        parser.add_argument(
+            '--group-skew', type=float, default=1.2,
+            help='Показатель Ципфа для популярности групп'
+        )
+        parser.add_argument(
+            '--no-group-share', type=float, default=0.3,
+            help='Доля постов без группы'
+        )
+        parser.add_argument(
+            '--days', type=float, default=365,
+            help='За сколько дней до --until раскидать даты постов'
+        )
+        parser.add_argument(
+            '--until', type=until_date,
+            help='Дата последнего поста, ISO 8601; по умолчанию сейчас'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов генерации; 0 - генерировать в этом же процессе'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Сколько записей генерировать и вставлять за раз'
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            seed=options['seed'],
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            group_follows=options['group_follows'],
+            images=options['images'],
+            image_share=options['image_share'],
+            author_skew=options['author_skew'],
+            group_skew=options['group_skew'],
+            no_group_share=options['no_group_share'],
+            days=options['days'],
+            until=options['until'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
+        started = time.monotonic()
+        try:
+            for stage, done, total in seeder.run():
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{stage}: {done} из {total}, {elapsed:.1f} с')
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с; пароль '
+            f'пользователей: {SEED_PASSWORD}'
+        ))
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import drain_queue, make_pool
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры картинок из очереди в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Размер пула; 0 - резать в этом же процессе'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько картинок брать из очереди за раз'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти'
+        )
+
+    def handle(self, *args, **options):
+        pool = make_pool(options['processes'])
+        try:
+            while True:
+                for ready, failed in drain_queue(
+                        options['batch_size'], pool):
+                    self.stdout.write(
+                        f'Миниатюры готовы: {ready}, ошибок: {failed}')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
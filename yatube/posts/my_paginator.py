@@ -1,9 +1,276 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
 from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Параметры запроса, в которых передаются курсоры соседних страниц
+AFTER_PARAM = 'after'
+BEFORE_PARAM = 'before'
+# Пропуск в окне номеров страниц
+ELLIPSIS = '…'
+
+
+def encode_cursor(post):
+    """Непрозрачный токен из пары (pub_date, id) поста или строки values()."""
+    if isinstance(post, dict):
+        pub_date, pk = post['pub_date'], post['id']
+    else:
+        pub_date, pk = post.pub_date, post.pk
+    raw = f'{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, id) или None, если токен битый."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def estimate_count(queryset):
+    """Дешёвая оценка размера нефильтрованной выборки или None.
+
+    MAX(id) в SQLite берётся из конца rowid-дерева без обхода таблицы;
+    из-за удалённых постов оценка получается сверху, и последние
+    страницы по ней могут оказаться пустыми.
+    """
+    query = getattr(queryset, 'query', None)
+    if query is None or query.where or query.distinct:
+        return None
+    if query.low_mark or query.high_mark is not None:
+        return None
+    result = queryset.model._default_manager.aggregate(max_pk=Max('pk'))
+    return result['max_pk'] or 0
+
+
+class WindowedPage(Page):
+    @property
+    def page_window(self):
+        return list(self.paginator.get_elided_page_range(
+            self.number, on_each_side=settings.PAGINATOR_WINDOW
+        ))
+
+
+class WindowedPaginator(Paginator):
+    """Paginator с компактным окном номеров и оценкой количества.
+
+    Вместо всех номеров страниц отдаёт окно вокруг текущей:
+    1 … 47 48 [49] 50 51 … 100000. Если таблица больше
+    PAGINATOR_ESTIMATE_THRESHOLD, COUNT(*) заменяется оценкой. Оценка
+    бывает больше настоящего числа постов: запрос страницы за концом
+    выборки пересчитывает количество точно и отдаёт последнюю страницу.
+    """
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, count=None):
+        super().__init__(
+            object_list, per_page, orphans, allow_empty_first_page
+        )
+        self._count = count
+        self.count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        if self._count is not None:
+            return self._count
+        estimate = estimate_count(self.object_list)
+        if (estimate is not None
+                and estimate > settings.PAGINATOR_ESTIMATE_THRESHOLD):
+            self.count_is_estimated = True
+            return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.count_is_estimated and not page.object_list:
+            # оценка ушла за конец выборки: считаем точно
+            self.count_is_estimated = False
+            self._count = self.object_list.count()
+            for name in ('count', 'num_pages'):
+                self.__dict__.pop(name, None)
+            page = super().page(min(page.number, self.num_pages))
+        return page
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield ELLIPSIS
+            yield from range(num_pages - on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
+
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации.
+
+    Сохраняет интерфейс Page, которым пользуется шаблон паджинатора,
+    но номера страницы и общего количества у неё нет.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        super().__init__(object_list, None, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<KeysetPage>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по (pub_date, id) без OFFSET.
+
+    Каждая страница - это диапазонный запрос от курсора, поэтому
+    стоимость не зависит от того, насколько глубоко листает читатель.
+    key - поля с датой и id поста, если они читаются из другой таблицы.
+    """
+
+    def __init__(self, object_list, per_page, key=('pub_date', 'pk')):
+        self.key = key
+        date_field, pk_field = key
+        super().__init__(
+            object_list.order_by(f'-{date_field}', f'-{pk_field}'), per_page
+        )
+
+    def fetch(self, cursor, backwards):
+        """Посты от курсора в порядке обхода, на один больше страницы."""
+        return keyset_slice(
+            self.object_list, self.key, cursor, backwards, self.per_page + 1)
+
+    def get_page(self, after=None, before=None):
+        cursor = decode_cursor(before)
+        backwards = cursor is not None
+        if not backwards:
+            cursor = decode_cursor(after)
+        # берём на один пост больше, чтобы узнать, есть ли что-то дальше
+        posts = self.fetch(cursor, backwards)
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if cursor is not None and not posts:
+            return self.get_page()
+        if backwards:
+            posts.reverse()
+            return KeysetPage(posts, self, has_more, True)
+        return KeysetPage(posts, self, cursor is not None, has_more)
+
+
+def keyset_slice(queryset, key, cursor, backwards, limit):
+    """Первые limit постов выборки за курсором."""
+    if cursor is None:
+        return list(queryset[:limit])
+    date_field, pk_field = key
+    pub_date, pk = cursor
+    # внешнее нестрогое условие по pub_date даёт диапазон по индексу,
+    # внутреннее OR отсекает посты с той же датой по id
+    if backwards:
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__gte': pub_date}),
+            Q(**{f'{date_field}__gt': pub_date})
+            | Q(**{f'{pk_field}__gt': pk}),
+        ).order_by(date_field, pk_field)
+    else:
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lte': pub_date}),
+            Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{f'{pk_field}__lt': pk}),
+        )
+    return list(queryset[:limit])
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """Курсорная пагинация по нескольким выборкам сразу.
+
+    Источник - тройка (queryset, key, post_field): выборка, её поля даты
+    и id поста и поле, через которое запись ссылается на пост (None,
+    если это сами посты). У каждого источника свой диапазонный запрос с
+    лимитом страницы; страница собирается слиянием по (pub_date, id),
+    пост из нескольких источников берётся один раз.
+    """
+
+    def __init__(self, sources, per_page):
+        Paginator.__init__(self, [], per_page)
+        self.sources = [
+            (queryset.order_by(f'-{date_field}', f'-{pk_field}'),
+             (date_field, pk_field), post_field)
+            for queryset, (date_field, pk_field), post_field in sources
+        ]
+
+    def fetch(self, cursor, backwards):
+        posts = {}
+        for queryset, key, post_field in self.sources:
+            for item in keyset_slice(
+                    queryset, key, cursor, backwards, self.per_page + 1):
+                post = getattr(item, post_field) if post_field else item
+                posts[post.pk] = post
+        return sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not backwards,
+        )[:self.per_page + 1]
 
 
-def paginate_queryset(post_list, request):
-    paginator = Paginator(post_list, settings.PAGINATOR_COUNT)
+def paginate_queryset(post_list, request, keyset=None, count=None):
+    if keyset is None:
+        keyset = (
+            AFTER_PARAM in request.GET
+            or BEFORE_PARAM in request.GET
+            or settings.PAGINATOR_KEYSET and 'page' not in request.GET
+        )
+    if keyset:
+        paginator = KeysetPaginator(post_list, settings.PAGINATOR_COUNT)
+        return paginator.get_page(
+            after=request.GET.get(AFTER_PARAM),
+            before=request.GET.get(BEFORE_PARAM),
+        )
+    paginator = WindowedPaginator(
+        post_list, settings.PAGINATOR_COUNT, count=count
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
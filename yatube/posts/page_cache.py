@@ -0,0 +1,121 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, quote_etag
+from django.utils.translation import get_language
+
+from core.routers import read_position
+
+from . import versions
+
+SURROGATE_HEADER = 'Surrogate-Key'
+# ключ, который есть у каждой страницы: сбрасывает весь кэш разом
+SITE_KEY = 'site'
+
+
+def _version_key(surrogate_key):
+    return f'page:v:{surrogate_key}'
+
+
+def purge(*surrogate_keys):
+    """Сбрасывает все закэшированные страницы с этими ключами."""
+    for surrogate_key in surrogate_keys:
+        versions.invalidate(_version_key(surrogate_key))
+
+
+def cache_anonymous_page(*surrogate_keys):
+    """Кэширует ответ вьюхи целиком для неавторизованных читателей.
+
+    Ключи - шаблоны вида 'group:{slug}', подставляются из аргументов URL,
+    поэтому попадание в кэш обходится без запросов к базе. Страница
+    хранится до сброса ключей через purge() или до PAGE_CACHE_TIMEOUT;
+    нулевой PAGE_CACHE_TIMEOUT выключает кэш. Страницы из реплик
+    кэшируются отдельно, по read_position.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.PAGE_CACHE_TIMEOUT
+            if (not timeout
+                    or request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            keys = [SITE_KEY] + [
+                key.format(**kwargs) for key in surrogate_keys
+            ]
+            current = versions.get_many([_version_key(key) for key in keys])
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            cache_key = 'page:{}:{}:{}:{}'.format(
+                path,
+                get_language(),
+                read_position(),
+                '.'.join(str(current[_version_key(key)]) for key in keys),
+            )
+            response = cache.get(cache_key)
+            if response is not None:
+                # валидаторы сохранились вместе с ответом
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response,
+                )
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200
+                    and not response.streaming
+                    and not response.cookies):
+                response[SURROGATE_HEADER] = ' '.join(keys)
+                cache.set(cache_key, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_feed(*surrogate_keys):
+    """Кэширует ленту Atom/RSS одну на всех читателей.
+
+    Лента не зависит от пользователя, поэтому, в отличие от
+    cache_anonymous_page, в кэш попадают и запросы вошедших. Ключи те
+    же, что у HTML-лент: новый или изменённый пост сбрасывает и ленту.
+    ETag - хэш отрисованной ленты, Last-Modified ставит Feed по самому
+    свежему посту; оба хранятся с ответом, поэтому опрос неизменной
+    ленты отвечает 304 без единого запроса к базе.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.FEED_CACHE_TIMEOUT
+            if not timeout or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            keys = [SITE_KEY] + [
+                key.format(**kwargs) for key in surrogate_keys
+            ]
+            current = versions.get_many([_version_key(key) for key in keys])
+            path = hashlib.md5(request.path.encode()).hexdigest()
+            cache_key = 'feed:{}:{}:{}'.format(
+                path,
+                read_position(),
+                '.'.join(str(current[_version_key(key)]) for key in keys),
+            )
+            response = cache.get(cache_key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response['ETag'] = quote_etag(
+                    hashlib.md5(response.content).hexdigest())
+                response[SURROGATE_HEADER] = ' '.join(keys)
+                cache.set(cache_key, response, timeout)
+            return get_conditional_response(
+                request,
+                etag=response['ETag'],
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified', '')),
+                response=response,
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import locks
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+from .models import Post
+
+# ширина x высота, кадрирование и формат: 480x169-center.webp
+SPEC_RE = re.compile(
+    r'^(?P<width>\d{1,4})x(?P<height>\d{1,4})'
+    r'-(?P<crop>center|top|bottom|left|right|fit)'
+    r'\.(?P<extension>jpg|webp|png)$'
+)
+CROP_CENTERING = {
+    'center': (0.5, 0.5),
+    'top': (0.5, 0),
+    'bottom': (0.5, 1),
+    'left': (0, 0.5),
+    'right': (1, 0.5),
+}
+FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP', 'png': 'PNG'}
+EXTENSIONS = {image_format: extension
+              for extension, image_format in FORMATS.items()}
+QUALITY = 85
+
+signer = signing.Signer(salt='posts.resize')
+
+
+class BadSpec(ValueError):
+    pass
+
+
+def make_spec(width, height, crop='center', image_format='JPEG'):
+    return f'{width}x{height}-{crop}.{EXTENSIONS[image_format]}'
+
+
+def parse_spec(spec):
+    """Размеры, кадрирование и формат из спецификации или BadSpec."""
+    match = SPEC_RE.match(spec)
+    if match is None:
+        raise BadSpec(spec)
+    width, height = int(match['width']), int(match['height'])
+    max_width, max_height = settings.RESIZE_MAX_SIZE
+    if not 0 < width <= max_width or not 0 < height <= max_height:
+        raise BadSpec(spec)
+    return width, height, match['crop'], FORMATS[match['extension']]
+
+
+def sign(name, spec):
+    return signer.signature(f'{name}:{spec}')
+
+
+def check_signature(signature, name, spec):
+    return constant_time_compare(signature, sign(name, spec))
+
+
+def resized_url(name, width, height, crop='center', image_format='JPEG'):
+    """Подписанный адрес варианта картинки; режется при первом запросе."""
+    spec = make_spec(width, height, crop, image_format)
+    return reverse('posts:resized_image', kwargs={
+        'signature': sign(name, spec), 'spec': spec, 'name': name,
+    })
+
+
+def cache_path(name, spec):
+    return os.path.join(settings.RESIZE_CACHE_ROOT, spec, name)
+
+
+def etag(name, spec):
+    # имя картинки - хэш содержимого, так что вариант по нему не меняется
+    return '"%s"' % hashlib.md5(f'{name}:{spec}'.encode()).hexdigest()
+
+
+def render(name, spec, path):
+    """Режет вариант из исходника и атомарно кладёт его по path."""
+    width, height, crop, image_format = parse_spec(spec)
+    storage = Post._meta.get_field('image').storage
+    with storage.open(name) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if crop == 'fit':
+            image.thumbnail((width, height), Image.LANCZOS)
+        else:
+            image = ImageOps.fit(
+                image, (width, height), Image.LANCZOS,
+                centering=CROP_CENTERING[crop])
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                image.save(output, image_format, quality=QUALITY)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def get_resized(name, spec):
+    """Путь к варианту в дисковом кэше; режет его, если ещё нет.
+
+    Запросы одного варианта ждут друг друга на файловой блокировке,
+    так что каждый вариант режется один раз на все процессы.
+    Файлы блокировок остаются рядом с вариантами.
+    """
+    path = cache_path(name, spec)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'wb') as lock_file:
+        locks.lock(lock_file, locks.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                render(name, spec, path)
+        finally:
+            locks.unlock(lock_file)
+    return path
+
+
+def drop_resized(name):
+    """Удаляет из дискового кэша все варианты картинки."""
+    if not os.path.isdir(settings.RESIZE_CACHE_ROOT):
+        return
+    for spec in os.listdir(settings.RESIZE_CACHE_ROOT):
+        path = cache_path(name, spec)
+        for stale in (path, path + '.lock'):
+            if os.path.exists(stale):
+                os.remove(stale)
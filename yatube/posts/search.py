@@ -0,0 +1,173 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection, connections
+from django.db.transaction import TransactionManagementError
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+# Триггеры держат индекс в синхронизации с posts_post.text. SQLite
+# пересоздаёт таблицу при изменении схемы и теряет триггеры, поэтому
+# они создаются заново после каждой миграции (см. ensure_triggers).
+TRIGGERS_SQL = (
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END''',
+)
+
+
+def _fts_exists(using_connection):
+    return FTS_TABLE in using_connection.introspection.table_names()
+
+
+def ensure_triggers(using='default', **kwargs):
+    """Создаёт недостающие триггеры индекса; подключён к post_migrate."""
+    using_connection = connections[using]
+    if (using_connection.vendor != 'sqlite'
+            or not _fts_exists(using_connection)):
+        return
+    with using_connection.cursor() as cursor:
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+def drop_triggers():
+    """Отключает обновление индекса; см. bulk_index."""
+    if connection.vendor != 'sqlite' or not _fts_exists(connection):
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+
+
+def build_match(query):
+    """Переводит строку пользователя в запрос FTS5.
+
+    Синтаксис FTS5 наружу не выпускаем: каждое слово берётся в кавычки
+    и ищется по префиксу, все слова должны встретиться в посте.
+    """
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+
+def matching_ids(match):
+    """Подзапрос с id постов, подходящих под запрос FTS5."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    )
+
+
+class SearchResults:
+    """Выдача поиска по релевантности для Paginator.
+
+    Считает и режет выборку внутри FTS5, а посты страницы достаёт
+    одним запросом по id.
+    """
+
+    def __init__(self, match, queryset):
+        self.match = match
+        self.queryset = queryset
+
+    def _fetch(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self):
+        if not self.match:
+            return 0
+        return self._fetch(
+            f'SELECT count(*) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s',
+            (self.match,)
+        )[0][0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step:
+            raise TypeError('Выдача поиска режется только срезами')
+        start = item.start or 0
+        limit = -1 if item.stop is None else max(item.stop - start, 0)
+        if not self.match or not limit:
+            return []
+        ids = [row[0] for row in self._fetch(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            (self.match, limit, start)
+        )]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query, queryset):
+    return SearchResults(build_match(query), queryset)
+
+
+def index_posts(after_id):
+    """Индексирует посты с id больше after_id и включает триггеры."""
+    if connection.vendor != 'sqlite' or not _fts_exists(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            f'SELECT id, text FROM posts_post WHERE id > %s',
+            (after_id,)
+        )
+    ensure_triggers()
+
+
+@contextmanager
+def bulk_index():
+    """Вставка постов с индексацией одним запросом в конце блока.
+
+    Триггер на каждую строку втрое замедляет массовую вставку, поэтому
+    внутри блока триггеры сняты, а на выходе новые посты индексируются
+    разом и триггеры возвращаются. Всё это - в транзакции вызывающего:
+    она держит блокировку на запись, и чужие правки и удаления старых
+    постов ждут её конца, когда триггеры уже на месте. При ошибке откат
+    возвращает триггеры вместе с остальным.
+    """
+    if connection.vendor != 'sqlite' or not _fts_exists(connection):
+        yield
+        return
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            'bulk_index работает только внутри транзакции')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT max(id) FROM posts_post')
+        last_id = cursor.fetchone()[0] or 0
+    drop_triggers()
+    yield
+    index_posts(after_id=last_id)
+
+
+def rebuild_index():
+    """Перестраивает индекс целиком по таблице постов.
+
+    Возвращает число проиндексированных постов.
+    """
+    ensure_triggers()
+    with connection.cursor() as cursor:
+        for command in ('rebuild', 'optimize'):
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES (%s)',
+                (command,)
+            )
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,433 @@
+"""Синтетические данные для нагрузочных прогонов: пользователи, группы,
+подписки и посты с перекосом, как на живом сайте.
+
+Активность авторов, популярность групп и частоты слов подчиняются
+закону Ципфа: у немногих авторов большая часть постов и подписчиков,
+немногие группы собирают большую часть постов. Генерация разбита на
+куски, каждый кусок считается в процессе пула от своего зерна, и
+результат не зависит от числа процессов. Вставляет только основной
+процесс: у SQLite писатель всё равно один. Посты вставляются тем же
+путём, что и в импорте (posts.importer), и пересчёт в конце общий.
+Подписки заводятся последними, и в ленты подписок попадают только
+TIMELINE_BACKFILL последних постов каждого источника.
+"""
+import datetime
+import math
+import posixpath
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import accumulate
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from .counters import rebuild_counters
+from .importer import (post_insert_sql, refresh_after_load,
+                       sqlite_bulk_settings)
+from .models import Follow, Group, GroupFollow, Post, StoredFile
+from .page_cache import SITE_KEY, purge
+from .search import bulk_index
+from .thumbnails import enqueue_many, thumbnails_ready
+from .timeline import backfill_follows
+
+User = get_user_model()
+
+FAKER_LOCALE = 'ru_RU'
+# под этим паролем можно войти любым сгенерированным пользователем
+SEED_PASSWORD = 'seed-password'
+CHUNK_SIZE = 20000
+VOCABULARY_SIZE = 500
+# длина поста в словах: логнормальная, медиана около 20 слов
+TEXT_WORDS_MU = 3
+TEXT_WORDS_SIGMA = 0.8
+TEXT_MAX_WORDS = 300
+
+# состояние процесса пула: зерно, id авторов и групп, накопленные веса
+_state = {}
+
+
+def zipf_weights(count, skew):
+    """Накопленные веса Ципфа: вес k-го по популярности 1 / k ** skew."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def select_ids(model, field, values):
+    """id записей model, у которых field - одно из values, по порядку id."""
+    values = list(values)
+    batch_size = connection.features.max_query_params or len(values) or 1
+    ids = []
+    for start in range(0, len(values), batch_size):
+        ids += model.objects.filter(**{
+            f'{field}__in': values[start:start + batch_size]
+        }).values_list('pk', flat=True)
+    return sorted(ids)
+
+
+def chunk_bounds(index, total, chunk_size):
+    return index * chunk_size, min((index + 1) * chunk_size, total)
+
+
+def prepare(state):
+    """Готовит генерацию в текущем процессе: словарь и веса выбора."""
+    _state.clear()
+    _state.update(state)
+    fake = Faker(FAKER_LOCALE)
+    fake.seed_instance(f'{state["seed"]}-words')
+    # порядок слов от зерна: от него зависит, какие слова частые
+    words = fake.words(nb=VOCABULARY_SIZE, unique=True)
+    _state.update(
+        fake=fake,
+        words=words,
+        word_weights=zipf_weights(len(words), 1),
+        author_weights=zipf_weights(
+            len(state.get('author_ids', ())), state.get('author_skew', 1)),
+        group_weights=zipf_weights(
+            len(state.get('group_ids', ())), state.get('group_skew', 1)),
+    )
+
+
+def _init_worker(state):
+    # при fork дочерний процесс не должен делить соединение с родителем
+    django.setup()
+    connections.close_all()
+    prepare(state)
+
+
+def _ordered(pool, function, count, depth):
+    # в работе не больше depth кусков: готовые ждут вставки в памяти
+    with pool:
+        pending = deque()
+        for index in range(count):
+            pending.append(pool.submit(function, index))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_chunks(function, count, state, workers):
+    """function(index) для кусков 0..count-1, результаты по порядку.
+
+    Пул поднимается сразу, а не при первом чтении результатов: перед
+    fork закрываются соединения, и внутри транзакции этого делать
+    нельзя.
+    """
+    if not workers:
+        prepare(state)
+        return map(function, range(count))
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(state,))
+    return _ordered(pool, function, count, workers * 2)
+
+
+def _random(kind, index):
+    return random.Random(f'{_state["seed"]}-{kind}-{index}')
+
+
+def make_text(rng):
+    length = min(
+        1 + int(rng.lognormvariate(TEXT_WORDS_MU, TEXT_WORDS_SIGMA)),
+        TEXT_MAX_WORDS)
+    words = rng.choices(
+        _state['words'], cum_weights=_state['word_weights'], k=length)
+    sentences = []
+    start = 0
+    while start < length:
+        end = start + rng.randint(4, 12)
+        sentence = ' '.join(words[start:end])
+        sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        start = end
+    return ' '.join(sentences)
+
+
+def user_chunk(index):
+    """Имена пользователей куска; номер в конце делает их уникальными."""
+    fake = _state['fake']
+    fake.seed_instance(f'{_state["seed"]}-users-{index}')
+    start, end = chunk_bounds(
+        index, _state['users'], _state['chunk_size'])
+    return [f'{fake.user_name()}_{number}' for number in range(start, end)]
+
+
+def _pick(rng, ids, weights, count):
+    if not ids or not count:
+        return set()
+    return set(rng.choices(ids, cum_weights=weights, k=count))
+
+
+def follow_chunk(index):
+    """Подписки пользователей куска: (на авторов, на группы).
+
+    Число подписок у читателя распределено экспоненциально, а на кого
+    подписываться, выбирается с теми же весами, что и авторы постов:
+    активные авторы и популярные группы собирают больше подписчиков.
+    """
+    rng = _random('follows', index)
+    start, end = chunk_bounds(
+        index, len(_state['user_ids']), _state['chunk_size'])
+    follows, group_follows = [], []
+    for user_id in _state['user_ids'][start:end]:
+        if _state['follows']:
+            count = int(rng.expovariate(1 / _state['follows']))
+            authors = _pick(rng, _state['author_ids'],
+                            _state['author_weights'], count)
+            follows += [
+                (user_id, author_id)
+                for author_id in sorted(authors - {user_id})
+            ]
+        if _state['group_follows']:
+            count = int(rng.expovariate(1 / _state['group_follows']))
+            groups = _pick(rng, _state['group_ids'],
+                           _state['group_weights'], count)
+            group_follows += [
+                (user_id, group_id) for group_id in sorted(groups)
+            ]
+    return follows, group_follows
+
+
+def post_chunk(index):
+    """Строки постов куска для INSERT по столбцам importer.INSERT_FIELDS.
+
+    Даты куска идут подряд в его доле периода: посты вставляются в
+    порядке публикации, как на живом сайте.
+    """
+    rng = _random('posts', index)
+    total = _state['posts']
+    start, end = chunk_bounds(index, total, _state['chunk_size'])
+    count = end - start
+    authors = rng.choices(
+        _state['author_ids'], cum_weights=_state['author_weights'], k=count)
+    groups = rng.choices(
+        _state['group_ids'], cum_weights=_state['group_weights'], k=count
+    ) if _state['group_ids'] else [None] * count
+    first = _state['since'] + _state['period'] * start / total
+    width = _state['period'] * count / total
+    stamps = sorted(first + width * rng.random() for _ in range(count))
+    adapt = connection.ops.adapt_datetimefield_value
+    images = _state['images']
+    rows = []
+    for author_id, group_id, stamp in zip(authors, groups, stamps):
+        if rng.random() < _state['no_group_share']:
+            group_id = None
+        image = ''
+        if images and rng.random() < _state['image_share']:
+            image = rng.choice(images)
+        pub_date = datetime.datetime.fromtimestamp(stamp, timezone.utc)
+        if not settings.USE_TZ:
+            pub_date = timezone.make_naive(pub_date)
+        pub_date = adapt(pub_date)
+        rows.append(
+            (make_text(rng), author_id, group_id, pub_date, pub_date, image))
+    return rows
+
+
+class Seeder:
+    """Генератор набора данных; run отдаёт (этап, сделано, всего)."""
+
+    def __init__(self, seed=0, users=100000, groups=1000, posts=1000000,
+                 follows=0, group_follows=0, images=0, image_share=0.1,
+                 author_skew=1.0, group_skew=1.2, no_group_share=0.3,
+                 days=365, until=None, workers=0, chunk_size=CHUNK_SIZE):
+        self.seed = seed
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.follows = follows
+        self.group_follows = group_follows
+        self.images = images
+        self.image_share = image_share
+        self.author_skew = author_skew
+        self.group_skew = group_skew
+        self.no_group_share = no_group_share
+        self.until = until or timezone.now()
+        self.since = self.until - datetime.timedelta(days=days)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.user_ids = []
+        self.group_ids = []
+        self.image_names = []
+
+    def chunks(self, total):
+        return math.ceil(total / self.chunk_size)
+
+    def state(self, **extra):
+        return dict(seed=self.seed, chunk_size=self.chunk_size, **extra)
+
+    def ranked(self, ids, kind):
+        """id в порядке популярности: первые в списке - самые активные."""
+        ids = sorted(ids)
+        random.Random(f'{self.seed}-{kind}').shuffle(ids)
+        return ids
+
+    def run(self):
+        yield from self.create_users()
+        self.create_groups()
+        yield 'Группы', len(self.group_ids), self.groups
+        self.create_images()
+        if self.images:
+            yield 'Картинки', len(self.image_names), self.images
+        state = self.state(
+            user_ids=self.user_ids,
+            author_ids=self.ranked(self.user_ids, 'authors'),
+            group_ids=self.ranked(self.group_ids, 'groups'),
+            author_skew=self.author_skew,
+            group_skew=self.group_skew,
+        )
+        if self.posts:
+            if not self.user_ids:
+                raise ValueError('Постам нужны авторы')
+            yield from self.create_posts(state)
+        # подписки заводятся после постов: иначе каждый пост раскладывался
+        # бы всем подписчикам автора и группы за всю историю
+        if self.follows or self.group_follows:
+            yield from self.create_follows(state)
+
+    def create_users(self):
+        # хэш пароля считается один раз: он нарочно медленный
+        password = make_password(SEED_PASSWORD)
+        done = 0
+        chunks = map_chunks(
+            user_chunk, self.chunks(self.users),
+            self.state(users=self.users), self.workers)
+        user_ids = []
+        for usernames in chunks:
+            User.objects.bulk_create(
+                (User(username=username, password=password)
+                 for username in usernames),
+                ignore_conflicts=True,
+            )
+            # при повторном запуске с тем же зерном пользователи уже
+            # есть: их id берутся по именам, а не по новым строкам
+            user_ids += select_ids(User, 'username', usernames)
+            done += len(usernames)
+            yield 'Пользователи', done, self.users
+        # без новых пользователей пишут уже существующие
+        self.user_ids = sorted(user_ids) if self.users else list(
+            User.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self):
+        if not self.groups:
+            self.group_ids = list(
+                Group.objects.order_by('pk').values_list('pk', flat=True))
+            return
+        fake = Faker(FAKER_LOCALE)
+        fake.seed_instance(f'{self.seed}-groups')
+        slugs = [f'seed-{self.seed}-{number}' for number in range(self.groups)]
+        Group.objects.bulk_create(
+            (Group(title=fake.catch_phrase()[:200], slug=slug,
+                   description=fake.paragraph())
+             for slug in slugs),
+            ignore_conflicts=True,
+        )
+        self.group_ids = select_ids(Group, 'slug', slugs)
+
+    def create_images(self):
+        """Картинки постов: цветные фигуры от зерна, по одной на номер."""
+        field = Post._meta.get_field('image')
+        rng = random.Random(f'{self.seed}-images')
+        width, height = settings.POST_IMAGE_SIZE
+
+        def color():
+            return tuple(rng.randrange(256) for _ in range(3))
+
+        for number in range(self.images):
+            image = Image.new('RGB', (width, height), color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                left, top = rng.randrange(width), rng.randrange(height)
+                box = (left, top, left + rng.randrange(1, width // 2),
+                       top + rng.randrange(1, height // 2))
+                draw.ellipse(box, fill=color())
+            content = BytesIO()
+            image.save(content, 'JPEG', quality=85)
+            name = posixpath.join(field.upload_to, f'seed-{number}.jpg')
+            self.image_names.append(
+                field.storage.save(name, ContentFile(content.getvalue())))
+
+    def create_follows(self, state):
+        state = dict(state, follows=self.follows,
+                     group_follows=self.group_follows)
+        last_id = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+        last_group_follow_id = GroupFollow.objects.aggregate(
+            last=Max('pk'))['last'] or 0
+        done = 0
+        chunks = map_chunks(
+            follow_chunk, self.chunks(len(self.user_ids)), state,
+            self.workers)
+        for follows, group_follows in chunks:
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    (Follow(user_id=user_id, author_id=author_id)
+                     for user_id, author_id in follows),
+                    ignore_conflicts=True,
+                )
+                GroupFollow.objects.bulk_create(
+                    (GroupFollow(user_id=user_id, group_id=group_id)
+                     for user_id, group_id in group_follows),
+                    ignore_conflicts=True,
+                )
+            done += self.chunk_size
+            yield 'Подписки', min(done, len(self.user_ids)), len(
+                self.user_ids)
+        # в ленты попадают последние посты источников, как при подписке
+        # по одной; горячие источники подмешиваются при чтении
+        rebuild_counters()
+        backfill_follows(last_id, last_group_follow_id)
+        purge(SITE_KEY)
+
+    def create_posts(self, state):
+        state = dict(
+            state,
+            posts=self.posts,
+            since=self.since.timestamp(),
+            period=(self.until - self.since).total_seconds(),
+            no_group_share=self.no_group_share,
+            images=self.image_names,
+            image_share=self.image_share,
+        )
+        last_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        insert_sql = post_insert_sql()
+        chunks = map_chunks(
+            post_chunk, self.chunks(self.posts), state, self.workers)
+        done = 0
+        try:
+            # авторы и группы взяты из базы, проверки внешних ключей на
+            # каждой строке ничего не добавят
+            with sqlite_bulk_settings(), \
+                    connection.constraint_checks_disabled():
+                for rows in chunks:
+                    with transaction.atomic(), bulk_index(), \
+                            connection.cursor() as cursor:
+                        cursor.executemany(insert_sql, rows)
+                    done += len(rows)
+                    yield 'Посты', done, self.posts
+        finally:
+            # даже после ошибки вставленное надо учесть в счётчиках
+            refresh_after_load(last_id, self.group_ids)
+            self.count_image_refs(last_id)
+
+    def count_image_refs(self, last_id):
+        """Ссылки на картинки для хранилища и очередь миниатюр."""
+        rows = Post.objects.filter(pk__gt=last_id).exclude(
+            image='').order_by().values_list('image').annotate(
+            count=Count('pk'))
+        for name, count in rows:
+            StoredFile.objects.get_or_create(name=name)
+            StoredFile.objects.filter(name=name).update(
+                refs=F('refs') + count)
+        enqueue_many(
+            (name for name in self.image_names
+             if not thumbnails_ready(name)),
+            batch_size=100,
+        )
@@ -0,0 +1,202 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cards import invalidate
+from .counters import (change_author_posts_count, change_group_posts_count,
+                       touch_feeds)
+from .models import Follow, Group, GroupFollow, Post, User
+from .page_cache import SITE_KEY, purge
+from .thumbnails import collect_image, enqueue_thumbnails, thumbnails_ready
+from .timeline import fan_out
+
+
+@receiver(post_save, sender=Post)
+def update_post_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_author_posts_count(instance.author_id, 1)
+        change_group_posts_count(instance.group_id, 1)
+    else:
+        old_author_id = getattr(
+            instance, '_loaded_author_id', instance.author_id)
+        if old_author_id != instance.author_id:
+            change_author_posts_count(old_author_id, -1)
+            change_author_posts_count(instance.author_id, 1)
+        old_group_id = getattr(
+            instance, '_loaded_group_id', instance.group_id)
+        if old_group_id != instance.group_id:
+            change_group_posts_count(old_group_id, -1)
+            change_group_posts_count(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrease_post_counters(sender, instance, **kwargs):
+    change_author_posts_count(instance.author_id, -1)
+    change_group_posts_count(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def touch_post_feeds(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    touch_feeds(
+        author_ids={
+            instance.author_id,
+            getattr(instance, '_loaded_author_id', instance.author_id),
+        },
+        group_ids={
+            instance.group_id,
+            getattr(instance, '_loaded_group_id', instance.group_id),
+        } - {None},
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # при смене автора или группы пост достаётся и новым подписчикам
+    if created or (
+            instance.author_id != getattr(
+                instance, '_loaded_author_id', instance.author_id)
+            or instance.group_id != getattr(
+                instance, '_loaded_group_id', instance.group_id)):
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Group)
+def touch_group_authors(sender, instance, created, raw=False, **kwargs):
+    # название и слаг группы видны в карточках на страницах её авторов
+    if created or raw:
+        return
+    touch_feeds(author_ids=Post.objects.filter(
+        group=instance).values('author_id'))
+
+
+@receiver(post_save, sender=User)
+def touch_author_feeds(sender, instance, created, raw=False,
+                       update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    touch_feeds(
+        author_ids=(instance.pk,),
+        group_ids=Post.objects.filter(
+            author=instance, group__isnull=False).values('group_id'),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_card(sender, instance, **kwargs):
+    invalidate('post', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_cards(sender, instance, **kwargs):
+    invalidate('group', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_cards(sender, instance, update_fields=None, **kwargs):
+    # вход пользователя обновляет только last_login, карточки не меняются
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate('user', instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    # при смене группы или автора страдают и старые страницы
+    group_ids = {
+        instance.group_id,
+        getattr(instance, '_loaded_group_id', instance.group_id),
+    }
+    author_ids = {
+        instance.author_id,
+        getattr(instance, '_loaded_author_id', instance.author_id),
+    }
+    slugs = Group.objects.filter(
+        pk__in=group_ids - {None}).values_list('slug', flat=True)
+    usernames = User.objects.filter(
+        pk__in=author_ids).values_list('username', flat=True)
+    purge(
+        'index',
+        *(f'group:{slug}' for slug in slugs),
+        *(f'author:{username}' for username in usernames),
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_pages_on_group_change(sender, instance, **kwargs):
+    # группа видна в карточках на любых лентах
+    purge(SITE_KEY)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def purge_pages_on_author_change(sender, instance, update_fields=None,
+                                 **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    purge(SITE_KEY)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_pages_on_follow(sender, instance, **kwargs):
+    # на странице автора виден счётчик подписчиков
+    purge(f'author:{instance.author.username}')
+
+
+@receiver(post_save, sender=GroupFollow)
+@receiver(post_delete, sender=GroupFollow)
+def purge_pages_on_group_follow(sender, instance, **kwargs):
+    purge(f'group:{instance.group.slug}')
+
+
+@receiver(post_save, sender=Post)
+def enqueue_post_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if instance.image.name == getattr(instance, '_loaded_image', None):
+        return
+    if not thumbnails_ready(instance.image.name):
+        enqueue_thumbnails(instance.image.name)
+
+
+def release_image(storage, image_name):
+    if not storage.release(image_name):
+        # файл удаляется только после коммита: при откате ссылка жива
+        transaction.on_commit(lambda: collect_image(image_name))
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_image = instance.image.name
+    old_image = '' if created else getattr(
+        instance, '_loaded_image', new_image)
+    # None - картинку не загружали из базы, и о смене ничего не известно
+    if old_image is None or old_image == new_image:
+        return
+    storage = instance.image.storage
+    if new_image:
+        storage.retain(new_image)
+    if old_image:
+        release_image(storage, old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.storage, instance.image.name)
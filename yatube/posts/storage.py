@@ -0,0 +1,78 @@
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def content_digest(content):
+    """sha256 содержимого файла, читается по кускам."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - хэш его содержимого.
+
+    Повторная загрузка того же файла получает то же имя и не пишется
+    на диск второй раз. Сколько записей ссылается на файл, хранится в
+    StoredFile: retain и release вызывают сигналы модели, а delete не
+    трогает файл, пока ссылки на него есть.
+    """
+
+    def content_name(self, name, content):
+        """posts/ab/abcd....jpg: каталог из upload_to, хэш и расширение."""
+        digest = content_digest(content)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # тот же файл успела записать параллельная загрузка
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # занятое имя значит, что файл с тем же содержимым уже есть:
+        # _save не должен подбирать другое имя
+        raise FileExistsError(name)
+
+    def _refs(self):
+        return apps.get_model('posts', 'StoredFile').objects
+
+    def retain(self, name):
+        """Добавляет ссылку на файл."""
+        self._refs().get_or_create(name=name)
+        self._refs().filter(name=name).update(refs=F('refs') + 1)
+
+    def release(self, name):
+        """Снимает ссылку на файл, возвращает число оставшихся."""
+        self._refs().filter(name=name, refs__gt=0).update(
+            refs=F('refs') - 1)
+        return self.refs(name)
+
+    def refs(self, name):
+        return self._refs().filter(name=name).values_list(
+            'refs', flat=True).first() or 0
+
+    def delete(self, name):
+        """Удаляет файл, только если на него больше никто не ссылается."""
+        if self.refs(name):
+            return
+        self._refs().filter(name=name).delete()
+        super().delete(name)
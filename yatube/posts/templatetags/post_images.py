@@ -0,0 +1,63 @@
+from django import template
+from django.conf import settings
+from sorl.thumbnail import default
+
+from ..resize import resized_url
+from ..thumbnails import post_image_variants
+
+register = template.Library()
+
+# карточка занимает всю ширину экрана, но не шире исходного кадра
+SIZES = '(max-width: {0}px) 100vw, {0}px'
+
+
+def variant_urls(image):
+    """(формат, ширина, адрес) вариантов; адрес None, если не нарезан."""
+    variants = list(post_image_variants())
+    if settings.POST_IMAGE_ON_DEMAND:
+        for image_format, width, geometry, _ in variants:
+            height = int(geometry.split('x')[1])
+            yield image_format, width, resized_url(
+                image.name, width, height, image_format=image_format)
+        return
+    thumbnails = default.backend.get_thumbnails(
+        image, [(geometry, options) for _, _, geometry, options in variants])
+    for (image_format, width, _, _), thumbnail in zip(variants, thumbnails):
+        yield image_format, width, thumbnail.url if thumbnail else None
+
+
+@register.inclusion_tag('includes/picture.html')
+def post_picture(image):
+    """<picture> из вариантов картинки поста.
+
+    Браузер сам выбирает формат из <source> и ширину из srcset. Пока
+    нет запасного варианта полной ширины, выводится заглушка.
+    """
+    if not image:
+        return {}
+    width, height = settings.POST_IMAGE_SIZE
+    fallback_format = settings.POST_IMAGE_FORMATS[-1]
+    srcsets = {}
+    src = None
+    for image_format, variant_width, url in variant_urls(image):
+        if url is None:
+            continue
+        srcsets.setdefault(image_format, []).append(
+            f'{url} {variant_width}w')
+        if image_format == fallback_format and variant_width == width:
+            src = url
+    context = {'has_image': True, 'width': width, 'height': height}
+    if src is None:
+        return context
+    context.update(
+        src=src,
+        srcset=', '.join(srcsets.pop(fallback_format)),
+        sources=[
+            {'type': f'image/{image_format.lower()}',
+             'srcset': ', '.join(srcsets[image_format])}
+            for image_format in settings.POST_IMAGE_FORMATS[:-1]
+            if image_format in srcsets
+        ],
+        sizes=SIZES.format(width),
+    )
+    return context
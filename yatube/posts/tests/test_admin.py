@@ -0,0 +1,131 @@
+import datetime
+
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..changelist import IndexedDatesQuerySet
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='admin', is_staff=True, is_superuser=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.dates = [
+            timezone.make_aware(datetime.datetime(2021, 12, 31, 12)),
+            timezone.make_aware(datetime.datetime(2022, 3, 1, 12)),
+            timezone.make_aware(datetime.datetime(2022, 3, 15, 12)),
+        ]
+        for i in range(150):
+            post = Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Текст {i}')
+        Post.objects.filter(pk=post.pk).update(pub_date=cls.dates[2])
+        Post.objects.filter(pk=post.pk - 1).update(pub_date=cls.dates[1])
+        Post.objects.filter(pk=post.pk - 2).update(pub_date=cls.dates[0])
+        cls.url = reverse('admin:posts_post_changelist')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.user)
+
+    def test_changelist_uses_cursors(self):
+        """Без сортировки список листается курсорами до конца."""
+        response = self.admin_client.get(self.url)
+        cl = response.context['cl']
+        self.assertIsNotNone(cl.keyset_page)
+        seen = [post.pk for post in cl.result_list]
+        while cl.keyset_page.has_next():
+            response = self.admin_client.get(self.url + cl.next_page_url)
+            cl = response.context['cl']
+            seen += [post.pk for post in cl.result_list]
+        self.assertEqual(
+            seen, list(Post.objects.values_list('pk', flat=True)))
+        self.assertContains(response, 'Предыдущая')
+
+    def test_sorting_falls_back_to_pages(self):
+        """Сортировка по колонке листается обычными номерами страниц."""
+        response = self.admin_client.get(self.url, {'o': '2', 'p': '1'})
+        cl = response.context['cl']
+        self.assertIsNone(cl.keyset_page)
+        self.assertEqual(cl.result_count, 150)
+
+    def test_group_editable_with_autocomplete(self):
+        """Группа правится в строке списка виджетом автодополнения."""
+        other = Group.objects.create(
+            title='Другая группа', slug='other', description='-')
+        response = self.admin_client.get(self.url)
+        field = response.context['cl'].formset.forms[0].fields['group']
+        # RelatedFieldWidgetWrapper добавляет ссылки на создание группы
+        self.assertIsInstance(field.widget.widget, AutocompleteSelect)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'Другая группа')
+        formset = response.context['cl'].formset
+        data = {
+            'form-TOTAL_FORMS': len(formset.forms),
+            'form-INITIAL_FORMS': len(formset.forms),
+            '_save': 'Сохранить',
+        }
+        for index, form in enumerate(formset.forms):
+            data[f'form-{index}-id'] = form.instance.pk
+            data[f'form-{index}-group'] = form.instance.group_id
+        data['form-0-group'] = other.pk
+        response = self.admin_client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Post.objects.get(pk=formset.forms[0].instance.pk).group, other)
+
+    @override_settings(PAGINATOR_ESTIMATE_THRESHOLD=0)
+    def test_changelist_estimates_count(self):
+        """На большой таблице число постов оценивается без COUNT(*)."""
+        response = self.admin_client.get(self.url)
+        self.assertTrue(response.context['cl'].paginator.count_is_estimated)
+        self.assertContains(response, 'около')
+
+    def test_date_hierarchy_filters_by_range(self):
+        """Отбор по дате выдаёт посты за период."""
+        cases = (
+            ({'pub_date__year': 2021}, [self.dates[0]]),
+            ({'pub_date__year': 2022, 'pub_date__month': 3},
+             [self.dates[2], self.dates[1]]),
+            ({'pub_date__year': 2022, 'pub_date__month': 3,
+              'pub_date__day': 15}, [self.dates[2]]),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.admin_client.get(self.url, params)
+                result_list = response.context['cl'].result_list
+                result = [post.pub_date for post in result_list]
+                self.assertEqual(result, expected)
+
+    def test_bad_date_redirects(self):
+        """Неверная дата в фильтре не роняет админку."""
+        response = self.admin_client.get(
+            self.url, {'pub_date__year': 2022, 'pub_date__month': 13})
+        self.assertRedirects(response, self.url + '?e=1')
+
+    def test_indexed_dates(self):
+        """dates() находит те же периоды, что и DISTINCT по таблице."""
+        queryset = IndexedDatesQuerySet(Post)
+        for kind in ('year', 'month'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    queryset.dates('pub_date', kind),
+                    list(Post.objects.dates('pub_date', kind)),
+                )
+        march = queryset.filter(
+            pub_date__gte=self.dates[1], pub_date__lt=self.dates[2]
+            + datetime.timedelta(days=1))
+        self.assertEqual(
+            march.dates('pub_date', 'day', order='DESC'),
+            [self.dates[2].date(), self.dates[1].date()],
+        )
@@ -0,0 +1,93 @@
+import csv
+import json
+from http import HTTPStatus
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.moderator = User.objects.create_user(
+            username='moderator', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Пост {number}, с "кавычками"\nи переносом',
+            )
+            for number in range(5)
+        ]
+        Post.objects.create(author=cls.other, text='Чужой пост')
+
+    def get(self, user, url):
+        client = Client()
+        client.force_login(user)
+        return client.get(url)
+
+    def profile_url(self, export_format):
+        return reverse('posts:profile_export',
+                       args=(self.author.username, export_format))
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_profile_csv(self):
+        """Автор выгружает свои посты в CSV потоком и по порядку."""
+        response = self.get(self.author, self.profile_url('csv'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['X-Total-Count'], '5')
+        self.assertIn('posts-author.csv', response['Content-Disposition'])
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(response.streaming_content).decode()
+        # все строки одним курсором, без запросов на каждый пост
+        self.assertEqual(len(queries), 1)
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows],
+                         [post.pk for post in self.posts])
+        self.assertEqual(rows[1]['text'], self.posts[1].text)
+        self.assertEqual(rows[1]['group'], 'test_slug')
+        self.assertEqual(rows[0]['group'], '')
+
+    def test_group_jsonl(self):
+        """Модератор выгружает посты группы в JSONL."""
+        response = self.get(
+            self.moderator,
+            reverse('posts:group_export', args=('test_slug', 'jsonl')))
+        self.assertEqual(response['X-Total-Count'], '2')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows],
+                         [self.posts[1].pk, self.posts[3].pk])
+        self.assertEqual(rows[0]['author'], 'author')
+
+    def test_access(self):
+        """Чужой профиль и группы выгружают только модераторы."""
+        group_url = reverse('posts:group_export', args=('test_slug', 'csv'))
+        cases = (
+            (self.other, self.profile_url('csv'), HTTPStatus.FORBIDDEN),
+            (self.author, group_url, HTTPStatus.FORBIDDEN),
+            (self.moderator, self.profile_url('csv'), HTTPStatus.OK),
+            (self.author, self.profile_url('xml'), HTTPStatus.NOT_FOUND),
+        )
+        for user, url, status in cases:
+            with self.subTest(user=user.username, url=url):
+                self.assertEqual(self.get(user, url).status_code, status)
+        response = Client().get(self.profile_url('csv'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
@@ -0,0 +1,116 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост <b>в группе</b>')
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        cls.guest = Client()
+        cls.reader = Client()
+        cls.reader.force_login(User.objects.create_user(username='reader'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """Ленты отдаются в обоих форматах и только со своими постами."""
+        cases = (
+            (reverse('posts:index_feed', args=('atom',)),
+             'application/atom+xml', '<entry>', 2),
+            (reverse('posts:group_feed', args=('test_slug', 'rss')),
+             'application/rss+xml', '<item>', 1),
+            (reverse('posts:profile_feed', args=('author', 'atom')),
+             'application/atom+xml', '<entry>', 2),
+        )
+        for url, content_type, item, count in cases:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                content = response.content.decode()
+                self.assertEqual(content.count(item), count)
+                # текст поста экранируется, а не вставляется как разметка
+                self.assertNotIn('<b>', content)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('ETag', response)
+
+    def test_not_found(self):
+        """Неизвестные группа, автор и формат - 404."""
+        for url in (reverse('posts:group_feed', args=('nope', 'atom')),
+                    reverse('posts:profile_feed', args=('nobody', 'rss')),
+                    reverse('posts:index_feed', args=('xml',))):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_served_from_cache(self):
+        """Повторный опрос ленты не ходит в базу и отвечает 304."""
+        url = reverse('posts:group_feed', args=('test_slug', 'atom'))
+        response = self.guest.get(url)
+        with self.assertNumQueries(0):
+            cached = self.guest.get(url)
+            not_modified = self.guest.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+            since = self.guest.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(since.status_code, HTTPStatus.NOT_MODIFIED)
+        # лента одна на всех: вошедший читатель получает её же
+        self.assertEqual(self.reader.get(url)['ETag'], response['ETag'])
+
+    def test_new_and_edited_posts(self):
+        """Новый или изменённый пост сбрасывает ленту и её ETag."""
+        url = reverse('posts:profile_feed', args=('author', 'rss'))
+        etag = self.guest.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Свежий пост', response.content.decode())
+        etag = response['ETag']
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Исправленный пост', response.content.decode())
+
+    @override_settings(FEED_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        """С нулевым FEED_CACHE_TIMEOUT лента строится на каждый запрос."""
+        url = reverse('posts:index_feed', args=('rss',))
+        self.guest.get(url)
+        with self.assertNumQueries(1):
+            self.guest.get(url)
+
+    def test_pages_link_feeds(self):
+        """Страницы лент ссылаются на свои Atom и RSS."""
+        cases = (
+            (reverse('posts:index'), reverse(
+                'posts:index_feed', args=('atom',))),
+            (reverse('posts:group_list', args=('test_slug',)), reverse(
+                'posts:group_feed', args=('test_slug', 'rss'))),
+            (reverse('posts:profile', args=('author',)), reverse(
+                'posts:profile_feed', args=('author', 'atom'))),
+        )
+        for page, feed in cases:
+            with self.subTest(page=page):
+                self.assertContains(self.guest.get(page), f'href="{feed}"')
@@ -0,0 +1,194 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..counters import rebuild_counters
+from ..models import (AuthorStats, Follow, Group, GroupFollow, Post,
+                      TimelineEntry)
+from ..timeline import follow_author, follow_group, timeline_paginator
+
+User = get_user_model()
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def timeline_ids(self, user):
+        return list(TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date').values_list('post_id', flat=True))
+
+    def feed_ids(self, user, **cursor):
+        page = timeline_paginator(user, 100).get_page(**cursor)
+        return [post.pk for post in page]
+
+    def test_follow_and_unfollow_author(self):
+        """Подписка на автора через POST, со счётчиком и без повторов."""
+        url = reverse('posts:profile_follow', args=('author',))
+        self.assertEqual(
+            self.reader_client.get(url).status_code,
+            HTTPStatus.METHOD_NOT_ALLOWED)
+        for _ in range(2):
+            response = self.reader_client.post(url)
+        self.assertRedirects(
+            response, reverse('posts:profile', args=('author',)))
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.author).count(), 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertContains(
+            self.reader_client.get(reverse('posts:profile', args=('author',))),
+            'Отписаться')
+        self.reader_client.post(
+            reverse('posts:profile_unfollow', args=('author',)))
+        self.assertFalse(Follow.objects.exists())
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_cannot_follow_self(self):
+        """На себя подписаться нельзя."""
+        self.reader_client.post(
+            reverse('posts:profile_follow', args=('reader',)))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_group(self):
+        """Подписка на группу меняет её счётчик."""
+        self.reader_client.post(
+            reverse('posts:group_follow', args=('test_slug',)))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.followers_count, 1)
+        self.reader_client.post(
+            reverse('posts:group_unfollow', args=('test_slug',)))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.followers_count, 0)
+        self.assertFalse(GroupFollow.objects.exists())
+
+    def test_new_post_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков автора и группы."""
+        follow_author(self.reader, self.author)
+        group_reader = User.objects.create_user(username='group_reader')
+        follow_group(group_reader, self.group)
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        other_post = Post.objects.create(author=self.other, text='Чужой')
+        self.assertEqual(self.timeline_ids(self.reader), [post.pk])
+        self.assertEqual(self.timeline_ids(group_reader), [post.pk])
+        self.assertNotIn(other_post.pk, self.timeline_ids(self.other))
+        # пост, перенесённый в группу, достаётся и её подписчикам
+        other_post.group = self.group
+        other_post.save()
+        self.assertEqual(self.timeline_ids(group_reader),
+                         [other_post.pk, post.pk])
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_follow_backfills_and_unfollow_cleans(self):
+        """Подписка приносит последние посты, отписка их убирает."""
+        posts = [
+            Post.objects.create(
+                author=self.author, group=self.group if i == 0 else None,
+                text=f'Пост {i}')
+            for i in range(3)
+        ]
+        follow_author(self.reader, self.author)
+        self.assertEqual(self.timeline_ids(self.reader),
+                         [posts[2].pk, posts[1].pk])
+        follow_group(self.reader, self.group)
+        self.reader_client.post(
+            reverse('posts:profile_unfollow', args=('author',)))
+        # пост в группе, на которую читатель подписан, остаётся
+        self.assertEqual(self.timeline_ids(self.reader), [posts[0].pk])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_hot_author_fanned_in(self):
+        """Посты горячего автора не раскладываются, а читаются напрямую."""
+        fan = User.objects.create_user(username='fan')
+        follow_author(fan, self.author)
+        follow_author(self.reader, self.author)
+        follow_author(self.reader, self.other)
+        follow_group(self.reader, self.group)
+        hot = Post.objects.create(
+            author=self.author, group=self.group, text='Горячий пост')
+        plain = Post.objects.create(author=self.other, text='Обычный пост')
+        older = Post.objects.create(author=self.author, text='Ещё пост')
+        # пост горячего автора в группе пришёл только через группу
+        self.assertEqual(self.timeline_ids(self.reader), [plain.pk, hot.pk])
+        self.assertEqual(self.timeline_ids(fan), [])
+        self.assertEqual(self.feed_ids(self.reader),
+                         [older.pk, plain.pk, hot.pk])
+        self.assertEqual(self.feed_ids(fan), [older.pk, hot.pk])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_cooled_author_backfilled(self):
+        """Автор, ставший обычным, раскладывается оставшимся подписчикам."""
+        fan = User.objects.create_user(username='fan')
+        follow_author(fan, self.author)
+        follow_author(self.reader, self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.timeline_ids(fan), [])
+        self.reader_client.post(
+            reverse('posts:profile_unfollow', args=('author',)))
+        self.assertEqual(self.timeline_ids(fan), [post.pk])
+
+    @override_settings(PAGINATOR_COUNT=2, TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_index_pages(self):
+        """Лента подписок листается курсорами по всем источникам."""
+        fan = User.objects.create_user(username='fan')
+        follow_author(fan, self.author)
+        follow_author(self.reader, self.author)
+        follow_author(self.reader, self.other)
+        posts = [
+            Post.objects.create(
+                author=self.author if i % 2 else self.other,
+                text=f'Пост {i}')
+            for i in range(5)
+        ]
+        url = reverse('posts:follow_index')
+        seen = []
+        page = self.reader_client.get(url).context['page_obj']
+        while True:
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            page = self.reader_client.get(
+                url, {'after': page.next_cursor}).context['page_obj']
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+        page = self.reader_client.get(
+            url, {'before': page.previous_cursor}).context['page_obj']
+        self.assertEqual([post.pk for post in page],
+                         [posts[2].pk, posts[1].pk])
+
+    def test_follow_index_requires_login(self):
+        """Лента подписок только для вошедших."""
+        response = Client().get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_rebuild_keeps_followers(self):
+        """Пересчёт счётчиков учитывает подписчиков, и авторов без постов."""
+        follow_author(self.reader, self.author)
+        follow_group(self.reader, self.group)
+        Post.objects.create(author=self.other, text='Пост')
+        Follow.objects.create(user=self.other, author=self.reader)
+        AuthorStats.objects.update(followers_count=0)
+        Group.objects.update(followers_count=0)
+        rebuild_counters()
+        counts = dict(AuthorStats.objects.values_list(
+            'author__username', 'followers_count'))
+        self.assertEqual(counts, {'author': 1, 'other': 0, 'reader': 1})
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.followers_count, 1)
@@ -1,11 +1,14 @@
 from http import HTTPStatus
+from io import BytesIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
 from ..models import Group, Post, User
+from .utils import TempMediaMixin, make_image
 
 
 class TaskURLTests(TestCase):
@@ -123,3 +126,82 @@ class TaskURLTests(TestCase):
                 text=form_data['text'],
             ).exists()
         )
+
+
+class ImageUploadTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+
+    def create(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image},
+        )
+
+    def test_upload_image(self):
+        """Картинка из формы сохраняется в посте."""
+        response = self.create(make_image())
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual((post.image.width, post.image.height), (20, 10))
+
+    def test_edit_replaces_image(self):
+        """Правка поста принимает новую картинку."""
+        post = Post.objects.create(author=self.author, text='Без картинки')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'С картинкой', 'image': make_image()},
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image.width, post.image.height), (20, 10))
+
+    def assertRejected(self, image, error):
+        response = self.create(image)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFormError(response, 'form', 'image', error)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_too_large_file_rejected(self):
+        """Файл больше лимита отбрасывается, пост не создаётся."""
+        # несжимаемый шум, чтобы PNG вышел больше мегабайта
+        noise = Image.frombytes('L', (1500, 1500), bytes(
+            (i * 7919) % 251 for i in range(1500 * 1500)))
+        content = BytesIO()
+        noise.save(content, 'PNG', compress_level=0)
+        self.assertGreater(len(content.getvalue()), 1024 * 1024)
+        self.assertRejected(
+            SimpleUploadedFile('big.png', content.getvalue(), 'image/png'),
+            'Файл больше 1 МБ',
+        )
+
+    @override_settings(
+        IMAGE_UPLOAD_MAX_SIZE=1024 * 1024, DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_too_large_request_rejected_before_reading(self):
+        """По Content-Length запрос отсекается до записи файла."""
+        self.assertRejected(
+            SimpleUploadedFile('big.png', b'0' * 2 * 1024 * 1024),
+            'Файл больше 1 МБ',
+        )
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None)
+    def test_no_fields_limit_accepts_upload(self):
+        """Без лимита на поля формы запрос по длине не отсекается."""
+        self.create(make_image())
+        self.assertEqual(Post.objects.get().image.width, 20)
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSIONS=(10, 10))
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше допустимых размеров отбрасывается."""
+        self.assertRejected(make_image(), 'Картинка больше 10×10 пикселей')
+
+    def test_not_image_rejected(self):
+        """Файл, который Pillow не узнаёт по заголовку, отбрасывается."""
+        self.assertRejected(
+            SimpleUploadedFile('text.png', b'not an image'),
+            'Загрузите картинку',
+        )
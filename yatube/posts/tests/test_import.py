@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from ..importer import PostImporter
+from ..models import AuthorStats, Group, Post
+from ..search import FTS_TABLE, search_posts
+
+User = get_user_model()
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def write(self, suffix, rows):
+        descriptor, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(descriptor, 'w', newline='', encoding='utf-8') as f:
+            if suffix == '.csv':
+                writer = csv.DictWriter(
+                    f, ['text', 'author', 'group', 'pub_date'])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                # строка файла пишется как есть, остальное - в JSON
+                for row in rows:
+                    if not isinstance(row, str):
+                        row = json.dumps(row, ensure_ascii=False)
+                    f.write(row + '\n')
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_import(self):
+        """Посты загружаются с датами, счётчиками и поисковым индексом."""
+        path = self.write('.jsonl', [
+            {'text': 'Импортированный ёжик', 'author': 'myuser',
+             'group': 'test_slug', 'pub_date': '2020-01-02T03:04:05'},
+            {'text': 'Второй пост', 'author': 'myuser'},
+            {'text': 'Чужой пост', 'author': 'stranger'},
+            {'text': '', 'author': 'myuser'},
+            {'text': 'Плохая дата', 'author': 'myuser', 'pub_date': 'вчера'},
+        ])
+        out, err = self.run_import(path, '--batch-size', '2')
+        self.assertIn('Загружено постов: 2, пропущено строк: 3', out)
+        self.assertIn("Строка 3: нет автора 'stranger'", err)
+        post = Post.objects.get(text='Импортированный ёжик')
+        self.assertEqual(
+            post.pub_date.isoformat(), '2020-01-02T03:04:05+00:00')
+        self.assertEqual(post.group, self.group)
+        stats = AuthorStats.objects.get(author=self.user)
+        self.assertEqual(stats.posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            [found.pk for found in search_posts(
+                'ёжик', Post.objects.all())[0:10]],
+            [post.pk])
+
+    def test_csv_creates_missing(self):
+        """CSV с новыми авторами и группами заводит их пачкой."""
+        path = self.write('.csv', [
+            {'text': f'Пост {number}', 'author': f'user{number % 3}',
+             'group': f'group{number % 2}', 'pub_date': '2021-05-06'}
+            for number in range(10)
+        ])
+        out, _ = self.run_import(
+            path, '--create-authors', '--create-groups',
+            '--batch-size', '4', '--chunk-size', '4')
+        self.assertIn('Загружено постов: 10, пропущено строк: 0', out)
+        self.assertEqual(
+            Group.objects.filter(slug__startswith='group').count(), 2)
+        author = User.objects.get(username='user1')
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(author.stats.posts_count, 3)
+
+    def test_malformed_json_skipped(self):
+        """Битая строка JSONL пропускается с номером, остальное грузится."""
+        path = self.write('.jsonl', [
+            {'text': 'Первый', 'author': 'myuser'},
+            '{"text": "Оборванный',
+            {'text': 'Третий', 'author': 'myuser'},
+        ])
+        out, err = self.run_import(path)
+        self.assertIn('Загружено постов: 2, пропущено строк: 1', out)
+        self.assertIn('Строка 2: не JSON', err)
+
+    def test_wrong_shape_rows_skipped(self):
+        """Строки не-объекты и поля не строками пропускаются и считаются."""
+        path = self.write('.jsonl', [
+            [1, 2],
+            {'text': 'Список авторов', 'author': ['myuser']},
+            'null',
+            {'text': 'Группа словарём', 'author': 'new',
+             'group': {'slug': 'new'}},
+            {'text': 42, 'author': 'myuser'},
+            {'text': 'Дата числом', 'author': 'myuser', 'pub_date': 2020},
+            {'text': 'Годный пост', 'author': 'new', 'group': 'new'},
+        ])
+        out, err = self.run_import(
+            path, '--create-authors', '--create-groups', '--batch-size', '4')
+        self.assertIn('Загружено постов: 1, пропущено строк: 6', out)
+        lines = err.splitlines()
+        self.assertEqual(lines, [
+            'Строка 1: строка не объект',
+            'Строка 2: author не строка',
+            'Строка 3: строка не объект',
+            'Строка 4: group не строка',
+            'Строка 5: text не строка',
+            'Строка 6: pub_date не строка',
+        ])
+        self.assertEqual(Post.objects.get().group.slug, 'new')
+
+    def test_csv_lines_count_header(self):
+        """Строки CSV нумеруются с учётом заголовка."""
+        path = self.write('.csv', [
+            {'text': 'Первый', 'author': 'myuser'},
+            {'text': 'Второй', 'author': 'stranger'},
+        ])
+        _, err = self.run_import(path)
+        self.assertEqual(err.splitlines(), ["Строка 3: нет автора 'stranger'"])
+
+    def test_triggers_restored(self):
+        """После импорта правки постов снова попадают в индекс."""
+        path = self.write('.jsonl', [{'text': 'Старый', 'author': 'myuser'}])
+        self.run_import(path)
+        post = Post.objects.get(text='Старый')
+        post.text = 'Новый'
+        post.save()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master "
+                "WHERE type = 'trigger' AND name LIKE %s",
+                (f'{FTS_TABLE}%',))
+            self.assertEqual(cursor.fetchone()[0], 3)
+        self.assertEqual(
+            len(search_posts('Новый', Post.objects.all())[0:10]), 1)
+
+    def test_edits_during_import_reach_index(self):
+        """Правки старых постов между транзакциями импорта видны в поиске."""
+        post = Post.objects.create(author=self.user, text='Черновик')
+        importer = PostImporter(batch_size=2, chunk_size=2)
+        chunks = importer.load(
+            (number, {'text': f'Импорт {number}', 'author': 'myuser'})
+            for number in range(1, 7))
+        next(chunks)
+        post.text = 'Чистовик'
+        post.save()
+        list(chunks)
+        importer.finish()
+        self.assertEqual(importer.stats.imported, 6)
+        with connection.cursor() as cursor:
+            # integrity-check сверяет индекс с таблицей постов
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) "
+                f"VALUES ('integrity-check', 1)")
+        posts = Post.objects.all()
+        self.assertFalse(search_posts('Черновик', posts)[0:10])
+        self.assertEqual(list(search_posts('Чистовик', posts)[0:10]), [post])
+        self.assertEqual(len(search_posts('Импорт', posts)[0:10]), 6)
+
+    def test_unknown_format(self):
+        """Формат не по расширению без --format - ошибка команды."""
+        with self.assertRaises(CommandError):
+            self.run_import('posts.xml')
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..models import AuthorStats, Group, Post
 
 User = get_user_model()
 
@@ -56,3 +60,59 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     task_post._meta.get_field(field).help_text, expected_value)
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group_1 = Group.objects.create(
+            title='Тестовая группа', slug='group_1', description='-')
+        cls.group_2 = Group.objects.create(
+            title='Другая группа', slug='group_2', description='-')
+
+    def assertCounters(self, author, group_1, group_2):
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).posts_count, author)
+        self.group_1.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group_1.posts_count, group_1)
+        self.assertEqual(self.group_2.posts_count, group_2)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании, смене группы и удалении."""
+        post = Post.objects.create(
+            author=self.user, group=self.group_1, text='Пост')
+        Post.objects.create(author=self.user, text='Пост без группы')
+        self.assertCounters(2, 1, 0)
+
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Пост', 'group': self.group_2.pk},
+        )
+        self.assertCounters(2, 0, 1)
+
+        post.refresh_from_db()
+        post.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        """Команда rebuild_post_counters чинит разошедшиеся счётчики."""
+        Post.objects.create(author=self.user, group=self.group_1, text='1')
+        Post.objects.create(author=self.user, group=self.group_1, text='2')
+        AuthorStats.objects.update(posts_count=100)
+        Group.objects.update(posts_count=100)
+        call_command('rebuild_post_counters', stdout=StringIO())
+        self.assertCounters(2, 2, 0)
+
+    def test_views_read_stored_counters(self):
+        """Профиль и пост берут количество из счётчика."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        AuthorStats.objects.update(posts_count=42)
+        client = Client()
+        response = client.get(reverse('posts:profile', args=('auth',)))
+        self.assertEqual(response.context['number_post_list'], 42)
+        response = client.get(reverse('posts:post_detail', args=(post.pk,)))
+        self.assertEqual(response.context['num_posts'], 42)
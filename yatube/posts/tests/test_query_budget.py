@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.middleware import QueryBudgetExceeded
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # несколько авторов и групп, чтобы N+1 было видно по числу запросов
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group{i}', description='-')
+            for i in range(3)
+        ]
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.users[i % 3],
+                group=cls.groups[i % 3] if i % 2 else None,
+                text=f'Тестовый текст {i}',
+            )
+        cls.author = cls.post.author
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+
+    def assertWithinBudget(self, view_name, method, url, data=None):
+        budget = settings.QUERY_BUDGETS[view_name]
+        # карточки отрисовываются заново - худший случай для бюджета
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.authorized_client, method)(url, data)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_views_within_budget(self):
+        """Страницы укладываются в бюджет запросов из настроек."""
+        post_id = {'post_id': self.post.pk}
+        cases = (
+            ('posts:index', 'get', reverse('posts:index'), None),
+            ('posts:index', 'get', reverse('posts:index'), {'page': 2}),
+            ('posts:group_list', 'get',
+             reverse('posts:group_list', args=('group1',)), None),
+            ('posts:profile', 'get',
+             reverse('posts:profile', args=(self.author.username,)), None),
+            ('posts:search', 'get', reverse('posts:search'),
+             {'q': 'текст'}),
+            ('posts:post_detail', 'get',
+             reverse('posts:post_detail', kwargs=post_id), None),
+            ('posts:post_create', 'get', reverse('posts:post_create'), None),
+            ('posts:post_create', 'post', reverse('posts:post_create'),
+             {'text': 'Новый пост', 'group': self.groups[0].pk}),
+            ('posts:post_edit', 'get',
+             reverse('posts:post_edit', kwargs=post_id), None),
+            ('posts:post_edit', 'post',
+             reverse('posts:post_edit', kwargs=post_id),
+             {'text': 'Правка', 'group': self.groups[2].pk}),
+            ('posts:profile_follow', 'post',
+             reverse('posts:profile_follow', args=('user0',)), None),
+            ('posts:group_follow', 'post',
+             reverse('posts:group_follow', args=('group0',)), None),
+            ('posts:follow_index', 'get', reverse('posts:follow_index'), None),
+            ('posts:profile_unfollow', 'post',
+             reverse('posts:profile_unfollow', args=('user0',)), None),
+            ('posts:group_unfollow', 'post',
+             reverse('posts:group_unfollow', args=('group0',)), None),
+        )
+        for view_name, method, url, data in cases:
+            with self.subTest(view_name=view_name, method=method, data=data):
+                self.assertWithinBudget(view_name, method, url, data)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_RAISE=True)
+    def test_middleware_raises_over_budget(self):
+        """Middleware роняет запрос сверх бюджета в режиме отладки."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.authorized_client.get(reverse('posts:index'))
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_RAISE=False)
+    def test_middleware_logs_over_budget(self):
+        """Без режима отладки превышение бюджета только пишется в лог."""
+        with self.assertLogs('core.middleware', 'WARNING'):
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,105 @@
+import os
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+from ..resize import cache_path, make_spec, resized_url
+from ..thumbnails import post_image_variants
+from .utils import TempMediaMixin, make_image
+
+User = get_user_model()
+
+
+class ResizedImageTests(TempMediaMixin, TestCase):
+    @classmethod
+    def media_settings(cls, media_root):
+        return {
+            **super().media_settings(media_root),
+            'RESIZE_CACHE_ROOT': os.path.join(media_root, 'resized'),
+        }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=make_image((400, 200), name='photo.png'),
+        )
+        self.url = resized_url(
+            self.post.image.name, 120, 60, image_format='WEBP')
+
+    def test_resizes_once_and_caches(self):
+        """Вариант режется при первом запросе и дальше берётся с диска."""
+        response = self.guest.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(BytesIO(b''.join(response))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (120, 60)))
+        path = cache_path(
+            self.post.image.name, make_spec(120, 60, image_format='WEBP'))
+        stamp = os.path.getmtime(path)
+        os.utime(path, (stamp - 100, stamp - 100))
+        self.assertEqual(self.guest.get(self.url).status_code, 200)
+        self.assertEqual(os.path.getmtime(path), stamp - 100)
+
+    def test_bad_signature_or_spec(self):
+        """Чужая подпись и размеры сверх лимита дают 404."""
+        name = self.post.image.name
+        forged = self.url.replace(make_spec(120, 60, image_format='WEBP'),
+                                  make_spec(240, 120, image_format='WEBP'))
+        with override_settings(RESIZE_MAX_SIZE=(100, 100)):
+            too_large = self.guest.get(self.url)
+        for response in (self.guest.get(forged), too_large,
+                         self.guest.get(resized_url('posts/none.png', 1, 1))):
+            with self.subTest(url=response.wsgi_request.path):
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(os.path.exists(cache_path(
+            name, make_spec(240, 120, image_format='WEBP'))))
+
+    def test_etag_and_ranges(self):
+        """По ETag отвечает 304, Range отдаёт кусок файла."""
+        full = b''.join(self.guest.get(self.url))
+        etag = self.guest.get(self.url)['ETag']
+        response = self.guest.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.guest.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, full[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(full)}')
+        response = self.guest.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.content, full[-5:])
+        response = self.guest.get(
+            self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.guest.get(
+            self.url, HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(POST_IMAGE_ON_DEMAND=True)
+    def test_templates_link_resize_endpoint(self):
+        """С POST_IMAGE_ON_DEMAND карточки ссылаются на подписанные адреса."""
+        response = self.guest.get(reverse('posts:index'))
+        for image_format, width, geometry, _ in post_image_variants():
+            height = int(geometry.split('x')[1])
+            self.assertContains(response, resized_url(
+                self.post.image.name, width, height,
+                image_format=image_format))
+        self.assertNotContains(response, 'img/placeholder.svg')
+        out = StringIO()
+        call_command('page_weight', '/', '--viewport', '360', '--dpr', '1',
+                     stdout=out)
+        self.assertNotIn('после 0 байт', out.getvalue())
@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import FTS_TABLE, build_match, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser', is_staff=True,
+                                            is_superuser=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.apple = Post.objects.create(
+            author=cls.user, text='Яблоко, яблоко и ещё раз яблоко')
+        cls.pear = Post.objects.create(
+            author=cls.user, group=cls.group, text='Груша и одно яблоко')
+        cls.plum = Post.objects.create(author=cls.user, text='Слива')
+        cls.client_user = Client()
+        cls.client_user.force_login(cls.user)
+
+    def search(self, query):
+        return list(search_posts(query, Post.objects.all())[0:10])
+
+    def test_build_match_escapes_syntax(self):
+        """Операторы FTS5 из строки пользователя не пропускаются."""
+        self.assertEqual(build_match('груша "AND ( NEAR'),
+                         '"груша"* "AND"* "NEAR"*')
+        self.assertEqual(build_match(' -*" '), '')
+
+    def test_results_ranked_by_relevance(self):
+        """Выдача упорядочена по релевантности, регистр не важен."""
+        self.assertEqual(self.search('ЯБЛОКО'), [self.apple, self.pear])
+        self.assertEqual(self.search('ябл груш'), [self.pear])
+        self.assertEqual(self.search(''), [])
+
+    def test_index_follows_post_changes(self):
+        """Триггеры обновляют индекс при правке и удалении поста."""
+        plum = Post.objects.get(pk=self.plum.pk)
+        plum.text = 'Слива стала яблоком'
+        plum.save()
+        self.assertIn(plum, self.search('яблоком'))
+        self.assertEqual(self.search('слива'), [plum])
+        plum.delete()
+        self.assertEqual(self.search('слива'), [])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты и сохраняет запрос."""
+        response = self.client_user.get(
+            reverse('posts:search'), {'q': 'яблоко'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.apple, self.pear])
+        self.assertEqual(response.context['page_query'], 'q=%D1%8F%D0%B1%D0'
+                         '%BB%D0%BE%D0%BA%D0%BE&')
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке ищет по индексу, а не LIKE по тексту."""
+        response = self.client_user.get(
+            reverse('admin:posts_post_changelist'), {'q': 'груша'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.pear])
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает потерянный индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(self.search('слива'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('постов 3', out.getvalue())
+        self.assertEqual(self.search('слива'), [self.plum])
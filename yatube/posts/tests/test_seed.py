@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+
+from ..models import (AuthorStats, Follow, Group, GroupFollow, Post,
+                      StoredFile, ThumbnailJob, TimelineEntry)
+from ..search import search_posts
+from .utils import TempMediaMixin
+
+User = get_user_model()
+
+
+class SeedTests(TempMediaMixin, TestCase):
+    def seed(self, *args):
+        out = StringIO()
+        call_command(
+            'seed', '--users', '40', '--groups', '4', '--posts', '600',
+            '--chunk-size', '100', '--until', '2020-01-01T00:00:00',
+            *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        return list(Post.objects.order_by('pk').values_list(
+            'author__username', 'group__slug', 'text', 'pub_date'))
+
+    def test_skewed_dataset(self):
+        """Посты с перекосом по авторам, счётчики, индекс и картинки."""
+        out = self.seed('--workers', '0', '--images', '2',
+                        '--image-share', '0.5')
+        self.assertIn('Готово', out)
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 600)
+        counts = list(AuthorStats.objects.order_by(
+            '-posts_count').values_list('posts_count', flat=True))
+        self.assertEqual(sum(counts), 600)
+        # у самого активного автора постов в разы больше среднего
+        self.assertGreater(counts[0], 3 * 600 / 40)
+        self.assertEqual(
+            Group.objects.aggregate(total=Sum('posts_count'))['total'],
+            Post.objects.filter(group__isnull=False).count())
+        pub_dates = [row[3] for row in self.snapshot()]
+        self.assertEqual(pub_dates, sorted(pub_dates))
+        word = Post.objects.first().text.split()[0].strip('.').lower()
+        self.assertTrue(search_posts(word, Post.objects.all())[:1])
+        with_image = Post.objects.exclude(image='').count()
+        self.assertTrue(0 < with_image < 600)
+        self.assertEqual(
+            StoredFile.objects.aggregate(total=Sum('refs'))['total'],
+            with_image)
+        self.assertEqual(ThumbnailJob.objects.count(), 2)
+
+    @override_settings(TIMELINE_BACKFILL=3)
+    def test_follows_backfill_timelines(self):
+        """Подписки учтены в счётчиках, ленты - последние посты источников."""
+        self.seed('--workers', '0', '--follows', '3', '--group-follows', '1')
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(GroupFollow.objects.exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertEqual(
+            AuthorStats.objects.aggregate(
+                total=Sum('followers_count'))['total'],
+            Follow.objects.count())
+        follow = Follow.objects.first()
+        recent = list(Post.objects.filter(author=follow.author_id).order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True)[:3])
+        entries = set(TimelineEntry.objects.filter(
+            user=follow.user_id).values_list('post_id', flat=True))
+        self.assertLessEqual(set(recent), entries)
+        # в ленте только посты тех, на кого читатель подписан
+        sources = set(Follow.objects.values_list('user', 'author')) | {
+            (user_id, ('group', group_id))
+            for user_id, group_id in GroupFollow.objects.values_list(
+                'user', 'group')
+        }
+        entries = TimelineEntry.objects.values_list(
+            'user', 'post__author', 'post__group')
+        self.assertTrue(entries)
+        for user_id, author_id, group_id in entries:
+            self.assertTrue(
+                (user_id, author_id) in sources
+                or (user_id, ('group', group_id)) in sources)
+
+    def test_rerun_reuses_users_and_groups(self):
+        """Повторный запуск с тем же зерном пишет от тех же авторов."""
+        self.seed('--workers', '0')
+        users = set(User.objects.values_list('pk', flat=True))
+        groups = set(Group.objects.values_list('pk', flat=True))
+        out = self.seed('--workers', '0')
+        self.assertIn('Группы: 4 из 4', out)
+        self.assertEqual(set(User.objects.values_list('pk', flat=True)), users)
+        self.assertEqual(set(Group.objects.values_list('pk', flat=True)),
+                         groups)
+        self.assertEqual(Post.objects.count(), 1200)
+        self.assertEqual(
+            AuthorStats.objects.aggregate(total=Sum('posts_count'))['total'],
+            1200)
+
+    def test_same_seed_same_data(self):
+        """Набор зависит только от зерна, а не от числа процессов."""
+        self.seed('--workers', '0')
+        expected = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed('--workers', '2')
+        self.assertEqual(self.snapshot(), expected)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed('--workers', '0', '--seed', '1')
+        self.assertNotEqual(self.snapshot(), expected)
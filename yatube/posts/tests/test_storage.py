@@ -0,0 +1,88 @@
+import re
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from ..models import Post, StoredFile
+from ..storage import ContentAddressedStorage
+from ..thumbnails import enqueue_thumbnails
+from .utils import SMALL_GIF, TempMediaMixin
+
+User = get_user_model()
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_same_content_stored_once(self):
+        """Одинаковое содержимое получает одно имя и один файл."""
+        first = self.storage.save('posts/a.GIF', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'meme'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        _, files = self.storage.listdir(first.rsplit('/', 1)[0])
+        self.assertEqual(files, [first.rsplit('/', 1)[1]])
+
+    def test_delete_keeps_referenced_file(self):
+        """Файл со ссылками не удаляется, без ссылок - удаляется."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'meme'))
+        self.storage.retain(name)
+        self.storage.retain(name)
+        self.assertEqual(self.storage.release(name), 1)
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.release(name), 0)
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_dedupe_moves_legacy_images(self):
+        """Старые картинки переезжают под хэш, копии сливаются в одну."""
+        user = User.objects.create_user(username='myuser')
+        for name in ('posts/one.gif', 'posts/two.gif'):
+            default.storage.save(name, ContentFile(b'meme'))
+            Post.objects.create(author=user, text=name)
+        Post.objects.filter(text='posts/one.gif').update(
+            image='posts/one.gif')
+        Post.objects.filter(text='posts/two.gif').update(
+            image='posts/two.gif')
+        out = StringIO()
+        call_command('dedupe_post_images', stdout=out)
+        self.assertIn(
+            'Перенесено картинок: 2, из них дубликатов 1', out.getvalue())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(self.storage.exists('posts/one.gif'))
+        self.assertFalse(self.storage.exists('posts/two.gif'))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+
+    def test_dedupe_refreshes_cached_cards(self):
+        """Карточка из кэша после переноса показывает новую картинку."""
+        cache.clear()
+        user = User.objects.create_user(username='myuser')
+        default.storage.save('posts/legacy.gif', ContentFile(SMALL_GIF))
+        post = Post.objects.create(author=user, text='Старая картинка')
+        Post.objects.filter(pk=post.pk).update(image='posts/legacy.gif')
+        enqueue_thumbnails('posts/legacy.gif')
+        call_command('thumbnail_worker', '--once', '--processes', '0',
+                     stdout=StringIO())
+        thumbnails = re.compile(r'/media/(cache/[^" ]+)')
+        before = set(thumbnails.findall(
+            self.client.get(reverse('posts:index')).content.decode()))
+        self.assertTrue(before)
+        call_command('dedupe_post_images', stdout=StringIO())
+        # миниатюры нового имени ещё в очереди: вместо старых - заглушка
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(thumbnails.findall(response.content.decode()))
+        self.assertContains(response, 'img/placeholder.svg')
@@ -0,0 +1,246 @@
+import re
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from ..kvstore import LRUCache, local_cache
+from ..models import Post, StoredFile, ThumbnailJob
+from ..thumbnails import post_image_variants
+from .utils import SMALL_GIF, TempMediaMixin, make_image
+
+User = get_user_model()
+
+
+class ThumbnailQueueTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.client_user = Client()
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+
+    def run_worker(self):
+        out = StringIO()
+        call_command(
+            'thumbnail_worker', '--once', '--processes', '0', stdout=out)
+        return out.getvalue()
+
+    def test_image_save_enqueues_job(self):
+        """Новая картинка ставит задачу, правка текста - нет."""
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=self.post.image.name).exists())
+        ThumbnailJob.objects.all().delete()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        Post.objects.create(author=self.user, text='Без картинки')
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_placeholder_until_worker_runs(self):
+        """Пока воркер не нарезал миниатюру, в ленте заглушка."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        for page in (reverse('posts:index'), url):
+            with self.subTest(page=page):
+                response = self.client_user.get(page)
+                self.assertContains(response, 'img/placeholder.svg')
+                self.assertNotContains(response, 'cache/')
+
+    def test_worker_generates_thumbnails(self):
+        """Воркер режет миниатюры, и ленты показывают их вместо заглушки."""
+        # карточка с заглушкой успела попасть в кэш
+        self.client_user.get(reverse('posts:index'))
+        out = self.run_worker()
+        self.assertIn('Миниатюры готовы: 1, ошибок: 0', out)
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.client_user.get(reverse('posts:index'))
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, 'cache/')
+
+    def test_worker_drops_broken_images(self):
+        """Битая картинка снимается с очереди и остаётся с заглушкой."""
+        ThumbnailJob.objects.create(image='posts/missing.gif')
+        with self.assertLogs('posts.thumbnails', 'ERROR'), \
+                self.assertLogs('sorl.thumbnail', 'ERROR'):
+            out = self.run_worker()
+        self.assertIn('ошибок: 1', out)
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_warm_render_skips_kvstore(self):
+        """Тёплая отрисовка миниатюр не ходит ни в базу, ни в общий кэш."""
+        self.run_worker()
+        self.client_user.get(reverse('posts:index'))
+        # сбрасываем общий кэш вместе с карточками: миниатюры должны
+        # найтись в памяти процесса
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.get(reverse('posts:index'))
+        self.assertContains(response, 'cache/')
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ])
+
+
+class ThumbnailInvalidationTests(TempMediaMixin, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='myuser')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        call_command('thumbnail_worker', '--once', '--processes', '0',
+                     stdout=StringIO())
+        self.thumbnail = default.backend.get_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True)
+
+    def test_new_image_drops_old_thumbnails(self):
+        """Смена картинки удаляет миниатюры старой из хранилища и с диска."""
+        self.assertTrue(self.thumbnail.exists())
+        self.post.image = make_image(
+            (1200, 424), 'JPEG', 'photo.jpg', noise=True)
+        self.post.save()
+        self.assertFalse(self.thumbnail.exists())
+        self.assertIsNone(default.kvstore.get(self.thumbnail))
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=self.post.image.name).exists())
+
+    def test_deleted_post_drops_thumbnails(self):
+        """Удаление поста удаляет миниатюры его картинки и сам файл."""
+        name = self.post.image.name
+        self.post.delete()
+        self.assertFalse(self.thumbnail.exists())
+        self.assertIsNone(default.kvstore.get(self.thumbnail))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_duplicate_reuses_thumbnails(self):
+        """Та же картинка в другом посте берёт готовые миниатюры."""
+        duplicate = Post.objects.create(
+            author=self.user,
+            text='Тот же мем',
+            image=SimpleUploadedFile(
+                'meme.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.assertEqual(duplicate.image.name, self.post.image.name)
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+    def test_shared_image_kept_until_last_post(self):
+        """Файл и миниатюры живут, пока на них ссылается хоть один пост."""
+        duplicate = Post.objects.create(
+            author=self.user,
+            text='Тот же мем',
+            image=SimpleUploadedFile(
+                'meme.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.post.delete()
+        self.assertTrue(duplicate.image.storage.exists(duplicate.image.name))
+        self.assertTrue(self.thumbnail.exists())
+        duplicate.delete()
+        self.assertFalse(self.thumbnail.exists())
+        self.assertFalse(StoredFile.objects.exists())
+
+
+class ResponsiveImageTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.client_user = Client()
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с фото',
+            image=make_image((1200, 424), 'JPEG', 'photo.jpg', noise=True),
+        )
+
+    def test_backfill_generates_all_variants(self):
+        """Бэкфилл ставит в очередь старые картинки и режет все варианты."""
+        ThumbnailJob.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_image_variants', '--processes', '0',
+                     stdout=out)
+        self.assertIn('картинок 1, ошибок 0', out.getvalue())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        for image_format, width, geometry, options in (
+                post_image_variants()):
+            with self.subTest(format=image_format, width=width):
+                thumbnail = default.backend.get_thumbnail(
+                    self.post.image, geometry, **options)
+                self.assertEqual(thumbnail.width, width)
+                self.assertTrue(thumbnail.name.endswith(
+                    '.webp' if image_format == 'WEBP' else '.jpg'))
+
+    def test_picture_markup(self):
+        """Карточка отдаёт <picture> с WebP и запасным JPEG в srcset."""
+        call_command('backfill_image_variants', '--processes', '0',
+                     stdout=StringIO())
+        response = self.client_user.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'type="image/webp"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f'.webp {width}w')
+            self.assertContains(response, f'.jpg {width}w')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_page_weight_drops_on_mobile(self):
+        """На телефоне страница весит меньше, чем с одной картинкой 960px."""
+        call_command('backfill_image_variants', '--processes', '0',
+                     stdout=StringIO())
+        for args in ((), ('--no-webp',)):
+            with self.subTest(args=args):
+                out = StringIO()
+                call_command('page_weight', '/', '--viewport', '360',
+                             '--dpr', '1', *args, stdout=out)
+                before, after = (
+                    int(value) for value in re.search(
+                        r'Итого картинок: до (\d+) байт, после (\d+)',
+                        out.getvalue()).groups()
+                )
+                self.assertGreater(before, 0)
+                self.assertLess(after, before)
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        """Сверх размера вытесняется давно не читанная запись."""
+        lru = LRUCache(max_size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')),
+                         (1, None, 3))
+
+    def test_entries_expire(self):
+        """Запись живёт не дольше таймаута."""
+        lru = LRUCache(max_size=2, timeout=0)
+        lru.set('a', 1)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
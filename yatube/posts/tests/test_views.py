@@ -1,11 +1,14 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django import forms
 
+from ..cards import card_cache_stats
 from ..models import Post, Group
+from ..my_paginator import ELLIPSIS, WindowedPaginator
 
 User = get_user_model()
 
@@ -113,6 +116,7 @@ class TaskPagesTests(TestCase):
         form_fields = {
             'text': forms.fields.CharField,
             'group': forms.fields.ChoiceField,
+            'image': forms.fields.ImageField,
         }
 
         for value, expected in form_fields.items():
@@ -131,6 +135,7 @@ class TaskPagesTests(TestCase):
         form_fields = {
             'text': forms.fields.CharField,
             'group': forms.fields.ChoiceField,
+            'image': forms.fields.ImageField,
         }
 
         for value, expected in form_fields.items():
@@ -240,3 +245,304 @@ class PaginatorTests(TestCase):
             reverse('posts:profile',
                     kwargs={'username': 'myuser'}) + '?page=2'))
         self.assertEqual(len(response.context['page_obj']), 3)
+
+
+@override_settings(PAGINATOR_KEYSET=True)
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        # генерируем 13 постов
+        for i in range(0, 13):
+            Post.objects.create(
+                author=cls.user,
+                group=cls.group,
+                text=f'Тестовый текст {i}',
+            )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'myuser'}),
+        )
+
+    def test_pages_follow_cursor(self):
+        """По курсорам страницы идут вперёд и назад без пропусков."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertTrue(first.is_keyset)
+                self.assertEqual(list(first), expected[:10])
+                self.assertFalse(first.has_previous())
+                self.assertTrue(first.has_next())
+
+                second = self.client.get(
+                    url, {'after': first.next_cursor}).context['page_obj']
+                self.assertEqual(list(second), expected[10:])
+                self.assertTrue(second.has_previous())
+                self.assertFalse(second.has_next())
+
+                back = self.client.get(
+                    url, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), expected[:10])
+                self.assertFalse(back.has_previous())
+
+    def test_page_number_still_works(self):
+        """Старые ссылки ?page=N продолжают работать."""
+        response = self.client.get(self.urls[0] + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.client.get(self.urls[0], {'after': '!!!'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class WindowedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        for i in range(0, 13):
+            Post.objects.create(author=cls.user, text='Тестовый текст')
+
+    def test_page_window_is_elided(self):
+        """Окно номеров страниц компактное при любом числе страниц."""
+        paginator = WindowedPaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(49)),
+            [1, ELLIPSIS, 47, 48, 49, 50, 51, ELLIPSIS, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, ELLIPSIS, 100],
+        )
+        self.assertEqual(
+            list(WindowedPaginator(range(30), 10).get_elided_page_range(2)),
+            [1, 2, 3],
+        )
+
+    @override_settings(PAGINATOR_ESTIMATE_THRESHOLD=5)
+    def test_count_is_estimated_for_large_table(self):
+        """Для большой таблицы COUNT(*) заменяется оценкой."""
+        Post.objects.order_by('pk').first().delete()
+        paginator = WindowedPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 13)
+        self.assertTrue(paginator.count_is_estimated)
+        # для отфильтрованной выборки оценки нет
+        paginator = WindowedPaginator(self.user.posts.all(), 10)
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.count_is_estimated)
+
+    @override_settings(PAGINATOR_ESTIMATE_THRESHOLD=5, PAGINATOR_COUNT=3)
+    def test_estimate_past_the_end_is_clamped(self):
+        """Страница за концом оценки - настоящая последняя страница."""
+        Post.objects.filter(
+            pk__in=Post.objects.order_by('pk').values('pk')[:5]).delete()
+        response = self.client.get(reverse('posts:index') + '?page=1')
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 5)
+        self.assertContains(response, '≈5')
+        paginator = WindowedPaginator(Post.objects.order_by('-pk'), 3)
+        page = paginator.page(5)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 2)
+        self.assertFalse(paginator.count_is_estimated)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertFalse(page.has_next())
+
+    def test_index_renders_page_window(self):
+        """Главная страница отрисовывает окно номеров страниц."""
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(response.context['page_obj'].page_window, [1, 2])
+        self.assertContains(response, '?page=1')
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_render_hits_cache(self):
+        """Повторная отрисовка берёт карточку из кэша."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(card_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_card_invalidated_on_changes(self):
+        """Карточка перерисовывается после правки поста, автора и группы."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Новый текст')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertContains(self.client.get(url), '/profile/renamed/')
+        self.group.slug = 'new_slug'
+        self.group.save()
+        self.assertContains(self.client.get(url), '/group/new_slug/')
+        self.assertEqual(card_cache_stats(), {'hits': 0, 'misses': 4})
+
+    def test_group_page_has_own_variant(self):
+        """На странице группы карточка без ссылки на группу."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}))
+        self.assertNotContains(response, 'все записи группы')
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый текст')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'myuser'}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_without_queries(self):
+        """Повторный запрос гостя отдаётся из кэша без запросов к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertIn('Surrogate-Key', second)
+
+    def test_authorized_user_not_cached(self):
+        """Авторизованный пользователь всегда получает свежую страницу."""
+        client = Client()
+        client.force_login(self.user)
+        client.get(self.urls[0])
+        response = client.get(self.urls[0])
+        self.assertNotIn('Surrogate-Key', response)
+
+    def test_new_post_purges_pages(self):
+        """Новый пост сбрасывает ленту, группу и профиль автора."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_other_group_stays_cached(self):
+        """Пост в другой группе не сбрасывает чужую страницу группы."""
+        other = Group.objects.create(
+            title='Другая', slug='other', description='-')
+        self.client.get(self.urls[1])
+        Post.objects.create(author=self.user, group=other, text='Мимо')
+        with self.assertNumQueries(0):
+            self.client.get(self.urls[1])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='myuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый текст')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'myuser'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def test_unchanged_page_returns_304(self):
+        """Неизменная страница отдаёт 304 по If-None-Match."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_if_modified_since_returns_304(self):
+        """Неизменная страница отдаёт 304 по If-Modified-Since."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                last_modified = self.client.get(url)['Last-Modified']
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_update_etag(self):
+        """Правка поста, группы или автора меняет ETag страниц."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                etags[url] = response['ETag']
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.user.first_name = 'Лев'
+        self.user.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        """Страница для вошедшего пользователя имеет свой ETag."""
+        etag = self.client.get(self.urls[0])['ETag']
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_page_cache_hit_returns_304(self):
+        """Попадание в кэш страниц тоже отвечает 304 без запросов."""
+        cache.clear()
+        etag = self.client.get(self.urls[0])['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+
+# картинка 2x1 для постов, где важна не картинка, а сам файл
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_image(size=(20, 10), fmt='PNG', name='image.png', noise=False):
+    """Картинка для загрузки в пост.
+
+    noise - шум вместо заливки: сжимается как фотография.
+    """
+    if noise:
+        image = Image.effect_noise(size, 64).convert('RGB')
+    else:
+        image = Image.new('RGB', size, 'orange')
+    content = BytesIO()
+    image.save(content, fmt, quality=90)
+    return SimpleUploadedFile(name, content.getvalue(), Image.MIME[fmt])
+
+
+class TempMediaMixin:
+    """Своя временная MEDIA_ROOT на класс тестов.
+
+    Каталог заводится перед тестами класса и удаляется после них, так
+    что файлы одного класса не видны другому.
+    """
+
+    @classmethod
+    def media_settings(cls, media_root):
+        """Настройки, которые действуют, пока идут тесты класса."""
+        return {'MEDIA_ROOT': media_root}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls._media_override = override_settings(
+            **cls.media_settings(cls.media_root))
+        cls._media_override.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._remove_media()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._remove_media()
+
+    @classmethod
+    def _remove_media(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
@@ -0,0 +1,178 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, ThumbnailJob
+from .resize import drop_resized
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не режет картинки во время запроса.
+
+    get_thumbnail отдаёт только готовую миниатюру из хранилища ключей,
+    иначе None - и тег {% thumbnail %} рисует ветку {% empty %}.
+    Нарезает миниатюры воркер через generate_thumbnail.
+    """
+
+    def _get_options(self, source, options):
+        # те же умолчания, что и в ThumbnailBackend.get_thumbnail,
+        # иначе имя миниатюры не совпадёт с нарезанной воркером
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        return self.get_thumbnails(file_, [(geometry_string, options)])[0]
+
+    def get_thumbnails(self, file_, variants):
+        """Готовые миниатюры для пар (геометрия, опции) или None."""
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnails = []
+        for geometry_string, options in variants:
+            options = self._get_options(source, dict(options))
+            name = self._get_thumbnail_filename(
+                source, geometry_string, options)
+            thumbnails.append(ImageFile(name, default.storage))
+        return default.kvstore.get_many(thumbnails)
+
+    def generate_thumbnail(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def post_image_variants():
+    """Формат, ширина, геометрия и опции sorl для вариантов картинки."""
+    full_width, full_height = settings.POST_IMAGE_SIZE
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * full_height / full_width)
+            yield image_format, width, f'{width}x{height}', {
+                'crop': 'center', 'upscale': True, 'format': image_format,
+            }
+
+
+def source_image(image_name):
+    """Картинка поста для sorl: ключи миниатюр считаются от её хранилища."""
+    return ImageFile(image_name, Post._meta.get_field('image').storage)
+
+
+def thumbnails_ready(image_name):
+    """Нарезаны ли уже все варианты картинки.
+
+    Имя картинки - хэш содержимого, поэтому повторно загруженный файл
+    сразу получает миниатюры, нарезанные для первой копии.
+    """
+    return all(default.backend.get_thumbnails(source_image(image_name), [
+        (geometry, options)
+        for _, _, geometry, options in post_image_variants()
+    ]))
+
+
+def enqueue_thumbnails(image_name):
+    ThumbnailJob.objects.get_or_create(image=image_name)
+
+
+def enqueue_many(image_names, batch_size):
+    """Ставит в очередь пачками; уже стоящие картинки пропускаются."""
+    batch = []
+    for name in image_names:
+        batch.append(ThumbnailJob(image=name))
+        if len(batch) == batch_size:
+            ThumbnailJob.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ThumbnailJob.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def drop_thumbnails(image_name):
+    """Удаляет миниатюры картинки, их записи и задачу в очереди."""
+    ThumbnailJob.objects.filter(image=image_name).delete()
+    delete(source_image(image_name), delete_file=False)
+
+
+def collect_image(image_name):
+    """Удаляет файл картинки, на который не осталось ссылок, и миниатюры."""
+    source = source_image(image_name)
+    if source.storage.refs(image_name):
+        return
+    drop_thumbnails(image_name)
+    drop_resized(image_name)
+    source.storage.delete(image_name)
+
+
+def generate_thumbnails(image_name):
+    """Нарезает все миниатюры картинки; выполняется в процессе пула.
+
+    Возвращает имя картинки и текст ошибки или None.
+    """
+    source = source_image(image_name)
+    try:
+        for _, _, geometry, options in post_image_variants():
+            default.backend.generate_thumbnail(source, geometry, **options)
+            # нечитаемый исходник sorl только пишет в лог и ничего не
+            # сохраняет, поэтому проверяем, что миниатюра появилась
+            if not default.backend.get_thumbnail(
+                    source, geometry, **options):
+                raise IOError(f'Миниатюра {geometry} не сохранилась')
+    except Exception as error:
+        logger.exception('Не удалось нарезать миниатюры %s', image_name)
+        return image_name, str(error)
+    return image_name, None
+
+
+def _init_worker():
+    # при fork дочерний процесс не должен делить соединение с родителем
+    django.setup()
+    connections.close_all()
+
+
+def make_pool(processes):
+    """Пул процессов для нарезки или None, если резать на месте."""
+    if not processes:
+        return None
+    connections.close_all()
+    return ProcessPoolExecutor(processes, initializer=_init_worker)
+
+
+def process_jobs(batch_size, pool=None):
+    """Разбирает одну пачку очереди, возвращает (готово, ошибок)."""
+    names = list(ThumbnailJob.objects.values_list(
+        'image', flat=True)[:batch_size])
+    if not names:
+        return 0, 0
+    mapper = pool.map if pool is not None else map
+    results = list(mapper(generate_thumbnails, names))
+    # упавшие картинки тоже снимаем с очереди: повтор упадёт так же,
+    # а пост так и останется с заглушкой
+    ThumbnailJob.objects.filter(image__in=names).delete()
+    ready = [name for name, error in results if error is None]
+    # сохранение обновляет метки изменения и сбрасывает кэш карточек и
+    # страниц, где вместо картинки стояла заглушка
+    for post in Post.objects.filter(image__in=ready):
+        post.save(update_fields=['updated'])
+    return len(ready), len(results) - len(ready)
+
+
+def drain_queue(batch_size, pool=None):
+    """Разбирает очередь до конца, отдавая (готово, ошибок) по пачкам."""
+    while True:
+        ready, failed = process_jobs(batch_size, pool)
+        if not ready and not failed:
+            return
+        yield ready, failed
@@ -0,0 +1,234 @@
+"""Лента подписок: раскладка постов при публикации и сборка при чтении.
+
+Новый пост сразу записывается в TimelineEntry каждому подписчику автора
+и группы, и лента читателя - один диапазон по индексу. Исключение -
+авторы и группы, у которых подписчиков больше TIMELINE_FANOUT_LIMIT:
+их посты не раскладываются, а подмешиваются при чтении отдельным
+диапазоном по индексу (author, pub_date) или (group, pub_date).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (AuthorStats, Follow, Group, GroupFollow, Post,
+                     TimelineEntry)
+from .my_paginator import MergedKeysetPaginator
+
+
+def is_hot(followers_count):
+    """Посты такого источника подмешиваются при чтении."""
+    return followers_count > settings.TIMELINE_FANOUT_LIMIT
+
+
+# подписчики нераскладываемых авторов и групп берут их посты при чтении
+FAN_OUT_SQL = """
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM posts_post post
+    JOIN posts_follow follow ON follow.author_id = post.author_id
+    LEFT JOIN posts_authorstats stats ON stats.author_id = post.author_id
+    WHERE {where} AND COALESCE(stats.followers_count, 0) <= %s
+    UNION
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM posts_post post
+    JOIN posts_groupfollow follow ON follow.group_id = post.group_id
+    JOIN posts_group grp ON grp.id = post.group_id
+    WHERE {where} AND grp.followers_count <= %s
+"""
+
+
+# последние посты источников для подписок, заведённых массово, как при
+# подписке по одной (follow_author, follow_group)
+BACKFILL_SQL = """
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM posts_follow follow
+    JOIN posts_authorstats stats ON stats.author_id = follow.author_id
+    JOIN posts_post post ON post.id IN (
+        SELECT id FROM posts_post WHERE author_id = follow.author_id
+        ORDER BY pub_date DESC, id DESC LIMIT %s
+    )
+    WHERE follow.id > %s AND stats.followers_count <= %s
+    UNION
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM posts_groupfollow follow
+    JOIN posts_group grp ON grp.id = follow.group_id
+    JOIN posts_post post ON post.id IN (
+        SELECT id FROM posts_post WHERE group_id = follow.group_id
+        ORDER BY pub_date DESC, id DESC LIMIT %s
+    )
+    WHERE follow.id > %s AND grp.followers_count <= %s
+"""
+
+
+def _write_entries(user_ids, posts):
+    entries = (
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _insert_entries(select_sql, params):
+    ops = connection.ops
+    sql = '{} posts_timelineentry (user_id, post_id, pub_date) {} {}'.format(
+        ops.insert_statement(ignore_conflicts=True),
+        select_sql,
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _fan_out(where, params):
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    _insert_entries(FAN_OUT_SQL.format(where=where),
+                    (*params, limit, *params, limit))
+
+
+def fan_out(post):
+    """Раскладывает пост подписчикам автора и группы одним INSERT."""
+    _fan_out('post.id = %s', (post.pk,))
+
+
+def fan_out_after(after_id):
+    """Раскладывает посты с id больше after_id, для массовой загрузки."""
+    _fan_out('post.id > %s', (after_id,))
+
+
+def backfill(user_ids, posts):
+    """Дописывает в ленты последние посты источника."""
+    recent = posts.order_by('-pub_date', '-pk').values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    _write_entries(user_ids, list(recent))
+
+
+def backfill_follows(after_id=0, after_group_follow_id=0):
+    """Заполняет ленты по подпискам с id больше данных, одним INSERT.
+
+    Для массовой загрузки подписок: счётчики подписчиков должны быть
+    уже пересчитаны, иначе не видно, кто из источников горячий.
+    """
+    backfill_count = settings.TIMELINE_BACKFILL
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    _insert_entries(BACKFILL_SQL, (
+        backfill_count, after_id, limit,
+        backfill_count, after_group_follow_id, limit,
+    ))
+
+
+def change_author_followers(author_id, delta):
+    """Меняет счётчик подписчиков автора, возвращает (было, стало)."""
+    before = AuthorStats.objects.filter(author_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if before is None:
+        # первой записи автора ещё нет - заводим её по фактическим числам
+        after = Follow.objects.filter(author_id=author_id).count()
+        AuthorStats.objects.create(
+            author_id=author_id,
+            posts_count=Post.objects.filter(author_id=author_id).count(),
+            followers_count=after,
+        )
+        return after - delta, after
+    AuthorStats.objects.filter(author_id=author_id).update(
+        followers_count=F('followers_count') + delta,
+        updated=timezone.now(),
+    )
+    return before, before + delta
+
+
+def change_group_followers(group_id, delta):
+    """Меняет счётчик подписчиков группы, возвращает (было, стало)."""
+    before = Group.objects.filter(pk=group_id).values_list(
+        'followers_count', flat=True).get()
+    Group.objects.filter(pk=group_id).update(
+        followers_count=F('followers_count') + delta,
+        updated=timezone.now(),
+    )
+    return before, before + delta
+
+
+@transaction.atomic
+def follow_author(user, author):
+    _, created = Follow.objects.get_or_create(user=user, author=author)
+    if not created:
+        return
+    _, followers_count = change_author_followers(author.pk, 1)
+    if not is_hot(followers_count):
+        backfill([user.pk], Post.objects.filter(author=author))
+
+
+@transaction.atomic
+def unfollow_author(user, author):
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    if not deleted:
+        return
+    before, after = change_author_followers(author.pk, -1)
+    # посты автора в группах, на которые читатель подписан, остаются
+    TimelineEntry.objects.filter(user=user, post__author=author).exclude(
+        post__group__followers__user=user).delete()
+    if is_hot(before) and not is_hot(after):
+        # автор больше не подмешивается при чтении - раскладываем его
+        # последние посты оставшимся подписчикам
+        backfill(
+            Follow.objects.filter(author=author).values_list(
+                'user_id', flat=True),
+            Post.objects.filter(author=author),
+        )
+
+
+@transaction.atomic
+def follow_group(user, group):
+    _, created = GroupFollow.objects.get_or_create(user=user, group=group)
+    if not created:
+        return
+    _, followers_count = change_group_followers(group.pk, 1)
+    if not is_hot(followers_count):
+        backfill([user.pk], Post.objects.filter(group=group))
+
+
+@transaction.atomic
+def unfollow_group(user, group):
+    deleted, _ = GroupFollow.objects.filter(user=user, group=group).delete()
+    if not deleted:
+        return
+    before, after = change_group_followers(group.pk, -1)
+    TimelineEntry.objects.filter(user=user, post__group=group).exclude(
+        post__author__following__user=user).delete()
+    if is_hot(before) and not is_hot(after):
+        backfill(
+            GroupFollow.objects.filter(group=group).values_list(
+                'user_id', flat=True),
+            Post.objects.filter(group=group),
+        )
+
+
+def timeline_paginator(user, per_page):
+    """Пагинатор ленты подписок: разложенные посты и горячие источники."""
+    sources = [(
+        TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'),
+        ('pub_date', 'post_id'),
+        'post',
+    )]
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    posts = Post.objects.select_related('author', 'group')
+    hot_authors = Follow.objects.filter(
+        user=user, author__stats__followers_count__gt=limit
+    ).values_list('author_id', flat=True)
+    sources += [
+        (posts.filter(author_id=author_id), ('pub_date', 'pk'), None)
+        for author_id in hot_authors
+    ]
+    hot_groups = GroupFollow.objects.filter(
+        user=user, group__followers_count__gt=limit
+    ).values_list('group_id', flat=True)
+    sources += [
+        (posts.filter(group_id=group_id), ('pub_date', 'pk'), None)
+        for group_id in hot_groups
+    ]
+    return MergedKeysetPaginator(sources, per_page)
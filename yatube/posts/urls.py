@@ -1,15 +1,36 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('feed.<str:feed_format>', feeds.index_feed, name='index_feed'),
     path('create/', views.post_create, name='post_create'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('group/<slug:slug>/export.<str:export_format>',
+         views.group_export, name='group_export'),
+    path('group/<slug:slug>/feed.<str:feed_format>',
+         feeds.group_feed, name='group_feed'),
+    path('group/<slug:slug>/follow/', views.group_follow,
+         name='group_follow'),
+    path('group/<slug:slug>/unfollow/', views.group_unfollow,
+         name='group_unfollow'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('search/', views.search, name='search'),
+    path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/export.<str:export_format>',
+         views.profile_export, name='profile_export'),
+    path('profile/<str:username>/feed.<str:feed_format>',
+         feeds.profile_feed, name='profile_feed'),
+    path('profile/<str:username>/follow/', views.profile_follow,
+         name='profile_follow'),
+    path('profile/<str:username>/unfollow/', views.profile_unfollow,
+         name='profile_unfollow'),
+    path('img/<str:signature>/<str:spec>/<path:name>',
+         views.resized_image, name='resized_image'),
 ]
@@ -0,0 +1,38 @@
+"""Версии ключей кэша.
+
+Запись кэша содержит в своём ключе версии всего, от чего она зависит.
+Чтобы сбросить сразу все такие записи, достаточно поднять версию.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def new_version():
+    # версия из времени, а не с нуля: если ключ версии вытеснен из кэша,
+    # новая версия не совпадёт ни с одной из старых записей
+    return time.time_ns()
+
+
+def bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def invalidate(key):
+    bump(key)
+    # повтор после коммита: читатель мог успеть закэшировать старые
+    # данные под новой версией, пока транзакция не была зафиксирована
+    transaction.on_commit(lambda: bump(key))
+
+
+def get_many(keys):
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
@@ -1,51 +1,193 @@
+import os
+import re
+
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import HttpResponseRedirect
+from django.core.exceptions import PermissionDenied
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseRedirect, StreamingHttpResponse)
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils.http import parse_etags, urlencode
+from django.views.decorators.http import require_POST, require_safe
 
-from .models import Group, Post
-from .my_paginator import paginate_queryset
+from .cards import attach_cards
+from .conditional import (conditional_page, group_stamp, index_stamp,
+                          post_stamp, profile_stamp)
+from .counters import author_posts_count
+from .export import CONTENT_TYPES, export_posts
+from .models import Follow, Group, GroupFollow, Post
+from .my_paginator import (AFTER_PARAM, BEFORE_PARAM, WindowedPaginator,
+                           paginate_queryset)
+from .page_cache import cache_anonymous_page
+from .resize import FORMATS, BadSpec, check_signature, etag, get_resized
+from .search import search_posts
+from .timeline import (follow_author, follow_group, timeline_paginator,
+                       unfollow_author, unfollow_group)
 from .forms import PostForm
 
 User = get_user_model()
 
 
+@cache_anonymous_page('index')
+@conditional_page(index_stamp)
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
     page_obj = paginate_queryset(post_list, request)
+    attach_cards(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page('group:{slug}')
+@conditional_page(group_stamp)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('author')
-    page_obj = paginate_queryset(post_list, request)
+    page_obj = paginate_queryset(post_list, request, count=group.posts_count)
+    attach_cards(page_obj, group=group)
+    following = request.user.is_authenticated and GroupFollow.objects.filter(
+        user=request.user, group=group).exists()
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'following': following,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page('author:{username}')
+@conditional_page(profile_stamp)
 def profile(request, username):
-    author = User.objects.get(username=username)
-    post_list = author.posts.all()
-    page_obj = paginate_queryset(post_list, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.select_related('group')
+    number_post_list = author_posts_count(author)
+    page_obj = paginate_queryset(post_list, request, count=number_post_list)
+    attach_cards(page_obj)
+    following = (
+        request.user.is_authenticated
+        and request.user != author
+        and Follow.objects.filter(user=request.user, author=author).exists()
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
-        'number_post_list': post_list.count
+        'number_post_list': number_post_list,
+        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required(login_url='/auth/login/')
+def follow_index(request):
+    paginator = timeline_paginator(request.user, settings.PAGINATOR_COUNT)
+    page_obj = paginator.get_page(
+        after=request.GET.get(AFTER_PARAM),
+        before=request.GET.get(BEFORE_PARAM),
+    )
+    attach_cards(page_obj)
+    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+
+
+@require_POST
+@login_required(login_url='/auth/login/')
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        follow_author(request.user, author)
+    return redirect('posts:profile', username=username)
+
+
+@require_POST
+@login_required(login_url='/auth/login/')
+def profile_unfollow(request, username):
+    author = get_object_or_404(User, username=username)
+    unfollow_author(request.user, author)
+    return redirect('posts:profile', username=username)
+
+
+@require_POST
+@login_required(login_url='/auth/login/')
+def group_follow(request, slug):
+    follow_group(request.user, get_object_or_404(Group, slug=slug))
+    return redirect('posts:group_list', slug=slug)
+
+
+@require_POST
+@login_required(login_url='/auth/login/')
+def group_unfollow(request, slug):
+    unfollow_group(request.user, get_object_or_404(Group, slug=slug))
+    return redirect('posts:group_list', slug=slug)
+
+
+def export_response(queryset, export_format, name, total):
+    if export_format not in CONTENT_TYPES:
+        raise Http404
+    response = StreamingHttpResponse(
+        export_posts(queryset, export_format),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{export_format}"')
+    # длина заранее неизвестна; для прогресса - число постов из счётчика
+    response['X-Total-Count'] = total
+    response['Cache-Control'] = 'private, no-store'
+    # nginx не должен копить ответ целиком, иначе прогресса не видно
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required(login_url='/auth/login/')
+def profile_export(request, username, export_format):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(
+        Post.objects.filter(author=author), export_format,
+        f'posts-{author.username}', author_posts_count(author),
+    )
+
+
+@login_required(login_url='/auth/login/')
+def group_export(request, slug, export_format):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(
+        Post.objects.filter(group=group), export_format,
+        f'group-{group.slug}', group.posts_count,
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_posts(
+        query, Post.objects.select_related('author', 'group')
+    )
+    paginator = WindowedPaginator(results, settings.PAGINATOR_COUNT)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    attach_cards(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@conditional_page(post_stamp)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    num_posts = Post.objects.filter(author__username=post.author).count
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    num_posts = author_posts_count(post.author)
     context = {
         'post': post,
         'num_posts': num_posts
@@ -68,24 +210,93 @@ def post_create(request):
 
 
 def post_edit(request, post_id):
-    post = Post.objects.get(pk=post_id)
-    if post.author.id != request.user.id:
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.id:
         return HttpResponseRedirect(reverse(
             'posts:post_detail', args=[post_id]))
-    if request.method == 'POST':
-        form = PostForm(request.POST, instance=post)
-        if form.is_valid():
-            form.save(commit=False)
-            form.save()
-            return redirect(f'/posts/{post.id}/', {'form': form})
-
     form = PostForm(
-        instance=post,
-        files=request.FILES or None
+        request.POST or None,
+        files=request.FILES or None,
+        instance=post
     )
+    if form.is_valid():
+        form.save()
+        return redirect(f'/posts/{post.id}/')
     context = {
         'post_id': post_id,
         'is_edit': True,
         'form': form
     }
     return render(request, 'posts/create_post.html', context)
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """(начало, конец) из заголовка Range или None для всего файла.
+
+    Несколько диапазонов сразу не поддерживаются: на них отдаём весь
+    файл, как разрешает RFC 7233. Недостижимый диапазон - ValueError.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: последние 500 байт
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+@require_safe
+def resized_image(request, signature, spec, name):
+    if not check_signature(signature, name, spec):
+        raise Http404
+    tag = etag(name, spec)
+    headers = {
+        'Cache-Control': (
+            f'public, max-age={settings.RESIZE_MAX_AGE}, immutable'),
+        'ETag': tag,
+        'Accept-Ranges': 'bytes',
+    }
+    if tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponse(status=304)
+    else:
+        try:
+            path = get_resized(name, spec)
+        except (BadSpec, OSError):
+            # битый исходник Pillow тоже сообщает через OSError
+            raise Http404
+        size = os.path.getsize(path)
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', tag) == tag:
+            try:
+                byte_range = parse_range(
+                    request.META.get('HTTP_RANGE', ''), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        content_type = f'image/{FORMATS[spec.rsplit(".", 1)[1]].lower()}'
+        if byte_range is None:
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            with open(path, 'rb') as image:
+                image.seek(start)
+                response = HttpResponse(
+                    image.read(end - start + 1), status=206,
+                    content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for header, value in headers.items():
+        response[header] = value
+    return response
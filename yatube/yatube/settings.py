@@ -23,6 +23,14 @@ ALLOWED_HOSTS = [
 
 NUMBER_POST = 10
 PAGINATOR_COUNT = 10
+# Курсорная пагинация (?after=/?before=) вместо ?page=N по умолчанию
+PAGINATOR_KEYSET = False
+# Сколько номеров страниц показывать по обе стороны от текущей
+PAGINATOR_WINDOW = 2
+# Начиная с какого размера таблицы COUNT(*) заменяется оценкой
+PAGINATOR_ESTIMATE_THRESHOLD = 100000
+# Больше стольких постов JSON API не отдаёт за раз, даже с ?limit=
+API_MAX_PAGE_SIZE = 100
 
 # Application definition
 
@@ -31,6 +39,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -42,6 +51,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +63,37 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Сколько SQL-запросов может сделать страница, по имени URL, с учётом
+# сессии и пользователя. Превышение пишется в лог, а с QUERY_BUDGET_RAISE
+# ещё и роняет запрос. Холодная отрисовка картинок через sorl.thumbnail
+# ходит в базу на каждую ещё не закэшированную картинку, поэтому по
+# умолчанию только лог; для поиска N+1 локально включайте
+# QUERY_BUDGET_RAISE = True
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 6,
+    'posts:profile': 6,
+    'posts:search': 5,
+    'posts:post_detail': 4,
+    'posts:post_create': 20,
+    'posts:post_edit': 20,
+    'posts:profile_export': 4,
+    'posts:group_export': 4,
+    'posts:index_feed': 1,
+    'posts:group_feed': 2,
+    'posts:profile_feed': 2,
+    'posts:follow_index': 8,
+    'posts:profile_follow': 14,
+    'posts:profile_unfollow': 14,
+    'posts:group_follow': 14,
+    'posts:group_unfollow': 14,
+    'api:index': 2,
+    'api:group_list': 3,
+    'api:profile': 3,
+    'api:post_detail': 2,
+}
+QUERY_BUDGET_RAISE = False
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
@@ -85,11 +127,74 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite с прагмами SQLITE_PRAGMAS и BEGIN IMMEDIATE
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение живёт между запросами потока, секунд
+        'CONN_MAX_AGE': 600,
+    },
+    # копия default только для чтения, её обновляет manage.py
+    # sync_replicas; читается, если указана в DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+    },
+}
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Реплики, из которых читают запросы без записи; пусто - всё из default
+DATABASE_REPLICAS = []
+# После записи пользователь столько секунд читает из default, пока
+# реплики не догонят
+REPLICA_PIN_SECONDS = 15
+REPLICA_PIN_COOKIE = 'primary'
+
+# Прагмы каждого нового соединения SQLite (core.backends.sqlite3).
+# Режим WAL хранится в самом файле базы; auto_vacuum действует только
+# на новой базе, старую переводит manage.py sqlite_maintenance
+# --enable-incremental-vacuum
+SQLITE_PRAGMAS = {
+    # до journal_mode: переход в WAL записывает заголовок новой базы,
+    # и режим вакуума после этого уже не сменить
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # ждать чужую запись до 5 с, а не падать с "database is locked"
+    'busy_timeout': 5000,
+    # отрицательный размер - в КБ, здесь 64 МБ на соединение
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Сколько живёт отрисованная карточка поста в кэше, секунд
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Кэш лент целиком для неавторизованных читателей, секунд; 0 - выключен
+PAGE_CACHE_TIMEOUT = 0
+# Ленты Atom/RSS кэшируются до нового или изменённого поста, секунд
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько последних постов в ленте и длина заголовка записи
+FEED_ITEMS_COUNT = 20
+FEED_TITLE_LENGTH = 60
+
+# Лента подписок: посты авторов и групп, у которых подписчиков больше
+# TIMELINE_FANOUT_LIMIT, не раскладываются по лентам при публикации, а
+# подмешиваются при чтении. При подписке в ленту сразу попадают
+# TIMELINE_BACKFILL последних постов
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 50
+TIMELINE_BATCH_SIZE = 500
+
+# Куда manage.py loadtest складывает результаты прогонов для сравнения
+LOADTEST_RESULTS_DIR = os.path.join(BASE_DIR, 'loadtest-results')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -127,6 +232,38 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
+# миниатюры режет воркер thumbnail_worker, запрос берёт только готовые
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+# LRU процесса перед общим кэшем, см. posts.kvstore
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_LRU_SIZE = 10000
+THUMBNAIL_LRU_TIMEOUT = 60
+# сколько помнить, что миниатюры нет, пока её режет воркер
+THUMBNAIL_MISS_TIMEOUT = 10
+# варианты картинки поста, которые воркер нарезает заранее: кадр
+# POST_IMAGE_SIZE в каждой из ширин и каждом из форматов. Последний
+# формат - запасной для <img>, остальные идут в <source> по порядку
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (480, 720, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+# выгрузка постов читает базу курсором по столько строк за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# варианты картинок по подписанным адресам posts:resized_image режутся
+# при первом запросе и кладутся на диск; с POST_IMAGE_ON_DEMAND шаблоны
+# ссылаются на них вместо заранее нарезанных миниатюр
+POST_IMAGE_ON_DEMAND = False
+RESIZE_CACHE_ROOT = os.path.join(BASE_DIR, 'resized')
+RESIZE_MAX_SIZE = (1920, 1920)
+RESIZE_MAX_AGE = 365 * 24 * 60 * 60
+
+# загрузки идут по кускам сразу на диск и отсекаются по размеру файла
+# и картинки до того, как файл дочитан, см. core.uploads
+FILE_UPLOAD_HANDLERS = ['core.uploads.BoundedImageUploadHandler']
+IMAGE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSIONS = (6000, 6000)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_URL = '/static/'